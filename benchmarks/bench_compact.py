@@ -0,0 +1,88 @@
+'''
+Benchmark of the in-memory size of the joint wind dataframe: pandas default
+types (float64 measurements, object end-of-record markers), the types of
+`parse.read_product` (float32, categorical) and `compact.CompactFrame`, on
+synthetic 10-minute data of a single station over 20 years with the value
+grid of the DWD products. Also times the monthly Weibull fits from the
+float column against the accumulators counted from the int16 codes.
+
+Run with `python benchmarks/bench_compact.py`.
+'''
+
+import sys
+import os
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../util/"))
+from compact import CompactFrame
+from timeindex import TimeIndex
+
+
+def synthetic_wind(years: int = 20, missing: float = 0.01, seed: int = 0) -> pd.DataFrame:
+    """
+    A frame with the columns of `Loader(["wind"], ...).as_dataframe[1]` in
+    pandas default types: speeds in steps of 0.1 m/s, directions in steps of
+    10 degrees and a random `missing` share of NaN values. The flag column
+    keeps the padding of the DWD header (`  QN`).
+    """
+    rng = np.random.default_rng(seed)
+    n = years * 365 * 144
+    speeds = np.round(8 * rng.weibull(2.0, n), 1)
+    speeds[rng.random(n) < missing] = np.nan
+    return pd.DataFrame({
+        "STATIONS_ID": np.full(n, 2115, dtype=np.int64),
+        "MESS_DATUM": pd.date_range("2000-01-01", periods=n, freq="10min").to_numpy(),
+        "  QN_wind": np.full(n, 3.0),
+        "FF_10_wind": speeds,
+        "DD_10_wind": rng.integers(0, 37, n) * 10.0,
+        "eor_wind": np.full(n, "eor", dtype=object),
+    })
+
+
+def parsed_types(df: pd.DataFrame) -> pd.DataFrame:
+    # the column types of `parse.read_product`
+    return df.astype({ "STATIONS_ID": "int32", "  QN_wind": "float32", "FF_10_wind": "float32", "DD_10_wind": "float32", "eor_wind": "category" })
+
+
+def best_time(fn, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def monthly_accumulators(frame: CompactFrame, index: TimeIndex):
+    codes, offsets = index.buckets("month")
+    return [frame.accumulator("FF_10_wind", slice(a, b)).estimate() for a, b in zip(offsets[:-1], offsets[1:])]
+
+
+if __name__ == "__main__":
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    default = synthetic_wind(years)
+    parsed = parsed_types(default)
+    start = time.perf_counter()
+    frame = CompactFrame.from_dataframe(parsed)
+    seconds = time.perf_counter() - start
+    print(f"{years} years, {len(default)} rows, conversion {seconds:.3f} s")
+    assert frame.columns["  QN_wind"].dtype == np.uint8, "the padded quality flag column is not stored as flags"
+    assert not any(c.startswith("eor") for c in frame.columns), "the end-of-record column is not dropped"
+
+    sizes = {
+        "pandas default types": default.memory_usage(deep=True, index=False).sum(),
+        "read_product types": parsed.memory_usage(deep=True, index=False).sum(),
+        "CompactFrame": frame.nbytes,
+    }
+    for name, size in sizes.items():
+        print(f"{name:<22} {size / 1e6:10.1f} MB {sizes['pandas default types'] / size:6.1f}x {sizes['read_product types'] / size:6.1f}x")
+
+    index = frame.time_index()
+    fits = {
+        "TimeIndex.estimate (float)": lambda: index.estimate(parsed["FF_10_wind"].to_numpy(dtype=float), "month"),
+        "accumulators (int16 codes)": lambda: monthly_accumulators(frame, index),
+    }
+    for name, fn in fits.items():
+        print(f"{name:<28} {best_time(fn):8.3f} s")
@@ -0,0 +1,62 @@
+'''
+Import times of the modules in `util/`, each measured in fresh interpreters
+(best of `--repeat`). The numeric core (the Weibull estimators and the
+homogeneity tests) has a time budget and must not load the plotting,
+network, Parquet or scipy modules, which are imported on first use. Exits
+with 1 if the core breaks either rule, so it can run as a check:
+
+    python benchmarks/bench_import.py
+'''
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+UTIL = os.path.abspath(os.path.join(os.path.dirname(__file__), "../util/"))
+CORE = ["weibull", "homogeneity"]
+# seconds, numpy alone takes about 0.1 s
+CORE_BUDGET = 0.25
+HEAVY = ["pandas", "scipy.special", "scipy.optimize", "scipy.stats", "sklearn", "matplotlib", "tueplots", "bs4", "requests", "pyarrow"]
+MODULES = [CORE, ["timeindex"], ["helpers"], ["dataloader"], ["batch"]]
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+for module in sys.argv[1:]:
+    __import__(module)
+seconds = time.perf_counter() - start
+print(json.dumps({ "seconds": seconds, "heavy": [m for m in %r if m in sys.modules] }))
+""" % HEAVY
+
+
+def measure(modules: list, repeat: int = 5) -> dict:
+    """
+    Returns the best import time of `modules` and the heavy modules they loaded.
+    """
+    results = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", PROBE] + modules, capture_output=True, text=True, cwd=UTIL, check=True)
+        results.append(json.loads(out.stdout))
+    return { "seconds": min(r["seconds"] for r in results), "heavy": results[0]["heavy"] }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import times of the util modules and the budget of the numeric core.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=CORE_BUDGET, help="import time budget of the core in seconds")
+    args = parser.parse_args()
+
+    failed = False
+    for modules in MODULES:
+        result = measure(modules, args.repeat)
+        print(f"{', '.join(modules):<22} {result['seconds']:7.3f} s  {', '.join(result['heavy']) or '-'}")
+        if modules == CORE:
+            if result["seconds"] > args.budget:
+                print(f"  the core takes longer than its budget of {args.budget} s")
+                failed = True
+            if len(result["heavy"]) > 0:
+                print(f"  the core must not import {result['heavy']} at load time")
+                failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,84 @@
+'''
+Benchmark of the multi-metric join in `Loader.as_dataframe`: the chained
+`pd.merge` it used before against `join.align_metrics` on synthetic
+10-minute data of 4 metrics over 20 years (about 1M rows per metric).
+
+Run with `python benchmarks/bench_join.py`.
+'''
+
+import sys
+import os
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../util/"))
+from join import align_metrics
+
+METRIC_COLUMNS = {
+    "wind": ["QN", "FF_10", "DD_10"],
+    "air_temperature": ["QN", "PP_10", "TT_10", "TM5_10", "RF_10", "TD_10"],
+    "precipitation": ["QN", "RWS_DAU_10", "RWS_10", "RWS_IND_10"],
+    "solar": ["QN", "DS_10", "GS_10", "SD_10", "LS_10"],
+}
+
+
+def synthetic_metrics(years: int = 20, missing: float = 0.01, seed: int = 0) -> dict:
+    """
+    Creates one sorted frame per metric with the column layout of `Loader.as_dataframe`,
+    each with a random `missing` share of timestamps dropped.
+    """
+    rng = np.random.default_rng(seed)
+    stamps = pd.date_range("2000-01-01", periods=years * 365 * 144, freq="10min").to_numpy()
+    metric_dfs = {}
+    for metric, columns in METRIC_COLUMNS.items():
+        keep = rng.random(len(stamps)) >= missing
+        n = int(keep.sum())
+        df = pd.DataFrame({ "STATIONS_ID": np.full(n, 2115, dtype=np.int32), "MESS_DATUM": stamps[keep] })
+        for column in columns:
+            df[f"{column}_{metric}"] = rng.weibull(2.0, n).astype(np.float32)
+        df[f"eor_{metric}"] = pd.Categorical(np.full(n, "eor"))
+        metric_dfs[metric] = df
+    return metric_dfs
+
+
+def chained_merge(metric_dfs: dict) -> pd.DataFrame:
+    # the join as it was done in `Loader.as_dataframe` before
+    dfs = list(metric_dfs.values())
+    df = pd.merge(dfs[0], dfs[1], on=["MESS_DATUM", "STATIONS_ID"], how="inner", suffixes=tuple(list(map(lambda x: "_" + x, metric_dfs.keys()))[:2]))
+    for i, df1 in enumerate(dfs[2:]):
+        df = pd.merge(df, df1, on=["MESS_DATUM", "STATIONS_ID"], how="inner", suffixes=(None, "_" + list(metric_dfs.keys())[i+2]))
+    return df
+
+
+def measure(fn, repeat: int = 3) -> tuple:
+    """
+    Returns the best wall time of `repeat` runs and the peak traced memory of one run in MB.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak / 1e6
+
+
+if __name__ == "__main__":
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    metric_dfs = synthetic_metrics(years)
+    print(f"{len(metric_dfs)} metrics, {years} years, {sum(len(df) for df in metric_dfs.values())} rows")
+
+    candidates = {
+        "chained pd.merge (inner)": lambda: chained_merge(metric_dfs),
+        "align_metrics (inner)": lambda: align_metrics(metric_dfs, how="inner"),
+        "align_metrics (outer)": lambda: align_metrics(metric_dfs, how="outer"),
+        "align_metrics (asof)": lambda: align_metrics(metric_dfs, how="asof", tolerance="10min"),
+    }
+    for name, fn in candidates.items():
+        seconds, peak = measure(fn)
+        print(f"{name:<28} {seconds:8.3f} s {peak:10.1f} MB peak")
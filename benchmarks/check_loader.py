@@ -0,0 +1,166 @@
+'''
+Runs `Loader` against a local copy of the DWD tree served with
+`http.server`, so the download, sync and parsing code is checked without
+the DWD servers. The tree in `fixtures/dwd` (written by
+`synthetic.write_dwd_tree`) is copied to a temporary folder, because some
+checks change the served files. Exits with 1 if a check fails:
+
+    python benchmarks/check_loader.py
+'''
+
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import threading
+import functools
+import http.server
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../util/"))
+from dataloader import Loader
+from multistation import MultiLoader
+import synthetic
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "dwd")
+PERIODS = ["historical", "recent"]
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(folder: str) -> http.server.ThreadingHTTPServer:
+    """
+    Serves `folder` on a free local port in a background thread.
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=folder))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def touch(path: str, offset: float = 10):
+    """
+    Moves the modification time of a served file forward, the server reports it with one second resolution.
+    """
+    mtime = os.path.getmtime(path) + offset
+    os.utime(path, (mtime, mtime))
+
+
+def unique_rows(folder: str, station_id: str) -> int:
+    """
+    Number of distinct timestamps in the served archives of a station.
+    """
+    stamps = []
+    for period in PERIODS:
+        for name in os.listdir(os.path.join(folder, "wind", period)):
+            if f"_{station_id}_" in name:
+                stamps.append(pd.read_csv(os.path.join(folder, "wind", period, name), sep=";", usecols=["MESS_DATUM"])["MESS_DATUM"])
+    return pd.concat(stamps).nunique()
+
+
+def cache_entries(data_folder: str) -> set:
+    folder = os.path.join(data_folder, "cache")
+    return { name for name in os.listdir(folder) if name.endswith(".parquet") } if os.path.isdir(folder) else set()
+
+
+class Checks:
+    def __init__(self):
+        self.failed = []
+
+    def __call__(self, name: str, condition: bool, detail=""):
+        print(f"{'ok    ' if condition else 'FAILED'} {name}" + (f" ({detail})" if detail and not condition else ""))
+        if not condition:
+            self.failed.append(name)
+
+
+def run(check: Checks, tree: str, base_url: str, data_folder: str):
+    # first sync downloads everything of the station
+    loader = Loader(["wind"], data_folder, "02115", base_url=base_url, periods=PERIODS)
+    report = loader.sync()
+    check("first sync adds the data and meta data archives", sorted(report.added) == sorted([
+        "10minutenwerte_wind_02115_20000101_20000104_hist.zip", "10minutenwerte_wind_02115_akt.zip", "Meta_Daten_zehn_min_ff_02115.zip",
+    ]), report)
+    check("first sync counts the overlapping rows once", report.new_rows == { "wind": unique_rows(tree, "02115") }, report.new_rows)
+    df = loader.as_dataframe[1]
+    check("as_dataframe has every timestamp once", len(df) == unique_rows(tree, "02115") and df["MESS_DATUM"].is_unique, len(df))
+
+    # nothing changed on the server
+    report = Loader(["wind"], data_folder, "02115", base_url=base_url, periods=PERIODS).sync()
+    check("second sync changes nothing", not report.has_changes, report)
+
+    # the recent archive grows by one day
+    # (the loader builds its compact frame before, the resync has to replace it)
+    loader = Loader(["wind"], data_folder, "02115", base_url=base_url, periods=PERIODS)
+    rows_before = loader.compact.minutes.size
+    recent = os.path.join(tree, "wind", "recent")
+    synthetic.write_dwd_archive(recent, 5 / 365, 2115, seed=1, start="2000-01-04", recent=True)
+    touch(os.path.join(recent, "10minutenwerte_wind_02115_akt.zip"))
+    report = loader.sync()
+    check("a changed archive is downloaded again", report.changed == ["10minutenwerte_wind_02115_akt.zip"], report)
+    check("the new rows of the changed archive are counted", report.new_rows == { "wind": 144 }, report.new_rows)
+    check("as_dataframe has the new rows", len(loader.as_dataframe[1]) == unique_rows(tree, "02115"), len(loader.as_dataframe[1]))
+    check("the compact frame has the new rows", loader.compact.minutes.size == unique_rows(tree, "02115") == rows_before + 144, (rows_before, loader.compact.minutes.size))
+    check("the cache entry of the replaced archive is pruned", len(cache_entries(data_folder)) == 2, cache_entries(data_folder))
+
+    # a second station in the same data folder
+    other = Loader(["wind"], data_folder, "00183", base_url=base_url, periods=PERIODS)
+    files = other.download_all_metrics()["wind"]
+    check("a second station gets its own archives", len(files) > 0 and all("00183" in os.path.basename(f) for f in files), files)
+    report = other.sync()
+    check("a sync of the second station removes nothing", report.removed == [], report.removed)
+    loader = Loader(["wind"], data_folder, "02115", base_url=base_url, periods=PERIODS)
+    df = loader.as_dataframe[1]
+    check("the first station still reads its own data", set(df["STATIONS_ID"]) == { 2115 } and len(df) == unique_rows(tree, "02115"), set(df["STATIONS_ID"]))
+    flags = { name: codes.dtype for name, codes in loader.compact.columns.items() if name.strip().startswith("QN") }
+    check("the compact frame stores the padded quality flags as uint8", flags == { "  QN_wind": np.uint8 }, flags)
+
+    # loaders of other stations and periods share the cache without evicting each other
+    other.as_dataframe
+    entries = cache_entries(data_folder)
+    Loader(["wind"], data_folder, "02115", base_url=base_url, periods=["historical"]).as_dataframe
+    check("loaders sharing the cache keep each other's entries", len(entries) == 4 and cache_entries(data_folder) == entries, cache_entries(data_folder))
+
+    # kept archives whose modification time changes on the server, but not their content
+    kept_folder = data_folder + "_kept"
+    Loader(["wind"], kept_folder, "02115", base_url=base_url, periods=PERIODS, keep_archives=True).sync()
+    touch(os.path.join(tree, "wind", "historical", "10minutenwerte_wind_02115_20000101_20000104_hist.zip"))
+    loader = Loader(["wind"], kept_folder, "02115", base_url=base_url, periods=PERIODS, keep_archives=True)
+    report = loader.sync()
+    check("a touched archive with the same content is unchanged", not report.has_changes and "10minutenwerte_wind_02115_20000101_20000104_hist.zip" in report.unchanged, report)
+    check("the kept archive is still readable", len(loader.as_dataframe[1]) == unique_rows(tree, "02115"))
+
+    # many stations at once: only stations with changed archives are parsed again
+    multi_folder = data_folder + "_multi"
+    multi = MultiLoader(["wind"], multi_folder, ["02115", "00183"], base_url=base_url, periods=PERIODS, max_processes=1)
+    check("a multi-station load builds every station", sorted(multi.load()) == ["00183", "02115"])
+    check("an unchanged multi-station load builds nothing", multi.load() == {})
+    touch(os.path.join(tree, "wind", "historical", "10minutenwerte_wind_00183_20000101_20000104_hist.zip"))
+    synthetic.write_dwd_archive(recent, 6 / 365, 2115, seed=1, start="2000-01-04", recent=True)
+    touch(os.path.join(recent, "10minutenwerte_wind_02115_akt.zip"), 20)
+    rows = MultiLoader(["wind"], multi_folder, ["02115", "00183"], base_url=base_url, periods=PERIODS, max_processes=1).load()
+    check("a changed archive of the same name is fetched again", rows == { "02115": unique_rows(tree, "02115") }, rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks the Loader against a local copy of the DWD tree served over HTTP.")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary folder and print its path")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="check_loader_")
+    tree = os.path.join(folder, "dwd")
+    shutil.copytree(FIXTURES, tree)
+    server = serve(tree)
+    check = Checks()
+    try:
+        run(check, tree, f"http://127.0.0.1:{server.server_address[1]}", os.path.join(folder, "data"))
+    finally:
+        server.shutdown()
+        if args.keep:
+            print(folder)
+        else:
+            shutil.rmtree(folder)
+    sys.exit(1 if len(check.failed) > 0 else 0)
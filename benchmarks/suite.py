@@ -0,0 +1,249 @@
+'''
+Benchmark suite of the entry points that are otherwise only exercised in the
+notebooks: `Loader.as_dataframe`, the Weibull estimators and `Weibull.fit`,
+the homogeneity tests of `helpers` and `ECA.load_dataset`. All inputs are
+synthetic (see `synthetic.py`), so the suite runs offline.
+
+For every entry point and size the suite records the best wall time of at
+least `--repeat` runs (fast calls are repeated until they ran for
+MIN_SECONDS in total) and the peak traced memory. Python has no counter of
+allocation events, so the suite does not report allocation counts; it
+records two related numbers of one traced call instead: `live_blocks`, the
+memory blocks allocated by the call that are still alive after it, and
+`gc_gen0_runs`, the number of generation 0 garbage collections during the
+call. The regression check only uses the wall time and the peak memory.
+The results are written as JSON
+and can be compared with the results of another version. A difference is
+only reported as a regression if it is larger than the relative threshold
+and than an absolute minimum, so the noise of sub-millisecond calls does
+not count:
+
+    python benchmarks/suite.py --sizes month year decade --output bench.json
+    python benchmarks/suite.py --compare bench.json
+
+Sizes are "month", "year", "decade", "50y" (one station each) and
+"50y-20st" (20 stations, every entry point runs over all of them).
+'''
+
+import sys
+import os
+import gc
+import json
+import time
+import argparse
+import platform
+import tempfile
+import functools
+import subprocess
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../util/"))
+import synthetic
+
+# years per station and number of stations
+SIZES = {
+    "month": (1 / 12, 1),
+    "year": (1, 1),
+    "decade": (10, 1),
+    "50y": (50, 1),
+    "50y-20st": (50, 20),
+}
+DEFAULT_SIZES = ["month", "year", "decade"]
+# relative slowdown (or growth of the peak memory) reported as a regression
+THRESHOLD = 0.2
+# smallest absolute slowdown (s) and growth of the peak memory (MB) reported as a regression
+MIN_DELTA_SECONDS = 0.005
+MIN_DELTA_MB = 1.0
+# fast calls are repeated until the timed runs take this long (s), at most MAX_RUNS times
+MIN_SECONDS = 0.2
+MAX_RUNS = 1000
+
+
+class Inputs:
+    """
+    The synthetic inputs of one size, created on first use.
+    """
+
+    def __init__(self, years: float, stations: int, folder: str):
+        self.years = years
+        self.stations = stations
+        self.folder = folder
+        self.station_ids = [2115 + i for i in range(stations)]
+
+    @functools.cached_property
+    def speeds(self) -> list:
+        return [synthetic.wind_speeds(int(self.years * synthetic.ROWS_PER_YEAR), seed=i) for i in range(self.stations)]
+
+    @functools.cached_property
+    def valid_speeds(self) -> list:
+        return [X[~np.isnan(X)] for X in self.speeds]
+
+    @functools.cached_property
+    def dwd_archives(self) -> list:
+        return [synthetic.write_dwd_archive(self.folder, self.years, station_id, seed=i) for i, station_id in enumerate(self.station_ids)]
+
+    @functools.cached_property
+    def eca_files(self) -> list:
+        return [synthetic.write_eca_series(self.folder, self.years, station_id=i + 1, seed=i) for i in range(self.stations)]
+
+
+def load_dwd(inputs: Inputs):
+    from dataloader import Loader
+    for station_id, archive in zip(inputs.station_ids, inputs.dwd_archives):
+        loader = Loader(["wind"], inputs.folder, station_id=f"{station_id:05d}", cache=False)
+        loader.metric_files = { "wind": [archive] }
+        loader.as_dataframe
+
+
+def estimate(method: str):
+    def run(inputs: Inputs):
+        from weibull import Weibull
+        for X in inputs.speeds:
+            Weibull.estimate(X, method)
+    return run
+
+
+def fit(inputs: Inputs):
+    from weibull import Weibull
+    weibull = Weibull(synthetic.LAMBDA, synthetic.BETA)
+    for X in inputs.speeds:
+        weibull.fit(pd.Series(X))
+
+
+def homogeneity(test: str):
+    def run(inputs: Inputs):
+        import helpers
+        for X in inputs.valid_speeds:
+            getattr(helpers, test)(X)
+    return run
+
+
+def load_eca(inputs: Inputs):
+    import ECA
+    for path in inputs.eca_files:
+        ECA.load_dataset(path)
+
+
+# entry point name -> (function of the inputs, function creating its files before the timing)
+CASES = {
+    "Loader.as_dataframe": (load_dwd, lambda inputs: inputs.dwd_archives),
+    "Weibull.estimate": (estimate("ml"), lambda inputs: inputs.speeds),
+    "Weibull.graphical_estimate": (estimate("graphical"), lambda inputs: inputs.speeds),
+    "Weibull.epf_estimate": (estimate("epf"), lambda inputs: inputs.speeds),
+    "Weibull.fit": (fit, lambda inputs: inputs.speeds),
+    "helpers.snh_test": (homogeneity("snh_test"), lambda inputs: inputs.valid_speeds),
+    "helpers.pettitt_test": (homogeneity("pettitt_test"), lambda inputs: inputs.valid_speeds),
+    "ECA.load_dataset": (load_eca, lambda inputs: inputs.eca_files),
+}
+
+
+def measure(fn, repeat: int = 5) -> dict:
+    """
+    Runs `fn` untraced for the best wall time, at least `repeat` times and
+    until the runs took MIN_SECONDS, and once traced for the memory
+    statistics, after a first run which imports the modules.
+    """
+    fn()
+    times = []
+    while len(times) < repeat or (sum(times) < MIN_SECONDS and len(times) < MAX_RUNS):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    collections = gc.get_stats()[0]["collections"]
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    fn()
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    live = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    return {
+        "seconds": min(times),
+        "runs": len(times),
+        "peak_mb": peak / 1e6,
+        "live_blocks": live,
+        "gc_gen0_runs": gc.get_stats()[0]["collections"] - collections,
+    }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def run(sizes: list, cases: list, repeat: int = 5) -> dict:
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for size in sizes:
+            years, stations = SIZES[size]
+            size_folder = os.path.join(folder, size)
+            os.makedirs(size_folder)
+            inputs = Inputs(years, stations, size_folder)
+            for case in cases:
+                fn, prepare = CASES[case]
+                prepare(inputs)
+                result = dict(case=case, size=size, **measure(lambda: fn(inputs), repeat))
+                print(f"{case:<28} {size:<9} {result['seconds']:9.4f} s {result['peak_mb']:10.1f} MB peak {result['live_blocks']:9d} live blocks {result['gc_gen0_runs']:6d} gen0 gc", flush=True)
+                results.append(result)
+    return { "environment": environment(), "repeat": repeat, "results": results }
+
+
+def compare(current: dict, baseline: dict, threshold: float = THRESHOLD, min_seconds: float = MIN_DELTA_SECONDS, min_mb: float = MIN_DELTA_MB) -> list:
+    """
+    Prints the ratios of the wall times and peak memory to the baseline for
+    every entry point and size in both results and returns the regressions:
+    a ratio above 1 + `threshold` with an absolute difference of more than
+    `min_seconds` or `min_mb`.
+    """
+    previous = { (r["case"], r["size"]): r for r in baseline["results"] }
+    regressions = []
+    print(f"\ncompared to {baseline['environment'].get('commit')} ({baseline['environment'].get('time')})")
+    for result in current["results"]:
+        old = previous.get((result["case"], result["size"]))
+        if old is None:
+            continue
+        time_ratio = result["seconds"] / old["seconds"] if old["seconds"] > 0 else np.nan
+        memory_ratio = result["peak_mb"] / old["peak_mb"] if old["peak_mb"] > 0 else np.nan
+        slower = time_ratio > 1 + threshold and result["seconds"] - old["seconds"] > min_seconds
+        larger = memory_ratio > 1 + threshold and result["peak_mb"] - old["peak_mb"] > min_mb
+        regressed = slower or larger
+        if regressed:
+            regressions.append((result["case"], result["size"]))
+        print(f"{result['case']:<28} {result['size']:<9} {time_ratio:6.2f}x time {memory_ratio:6.2f}x memory{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the loaders, estimators and statistical tests.")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, choices=list(SIZES))
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--repeat", type=int, default=5, help="minimum number of timed runs")
+    parser.add_argument("--output", help="json file to store the results in")
+    parser.add_argument("--compare", help="json file of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="relative slowdown reported as a regression")
+    parser.add_argument("--min-delta", type=float, default=MIN_DELTA_SECONDS, help="smallest slowdown in seconds reported as a regression")
+    parser.add_argument("--min-delta-mb", type=float, default=MIN_DELTA_MB, help="smallest growth of the peak memory in MB reported as a regression")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.cases, args.repeat)
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=2)
+    if args.compare:
+        with open(args.compare, "r") as fh:
+            regressions = compare(results, json.load(fh), args.threshold, args.min_delta, args.min_delta_mb)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,112 @@
+'''
+Synthetic inputs for the benchmarks: Weibull distributed 10-minute wind
+speeds and files in the layout of the DWD 10-minute products and the ECA&D
+daily series, so everything runs offline. `write_dwd_tree` writes a small
+copy of the DWD directory tree which `check_loader.py` serves over HTTP.
+'''
+
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+
+# parameters of the synthetic speeds (m/s), roughly those of Helgoland
+LAMBDA = 8.0
+BETA = 2.0
+ROWS_PER_YEAR = 365 * 144
+
+
+def wind_speeds(n: int, missing: float = 0.01, seed: int = 0) -> np.ndarray:
+    """
+    n Weibull distributed speeds in steps of 0.1 m/s (like FF_10), a `missing` share is NaN.
+    """
+    rng = np.random.default_rng(seed)
+    speeds = np.round(LAMBDA * rng.weibull(BETA, n), 1)
+    speeds[rng.random(n) < missing] = np.nan
+    return speeds
+
+
+def wind_frame(years: float, station_id: int = 2115, seed: int = 0, start: str = "1970-01-01") -> pd.DataFrame:
+    """
+    The joint frame of `Loader(["wind"], ...).as_dataframe[1]` for `years` of 10-minute data from `start`.
+    """
+    n = int(years * ROWS_PER_YEAR)
+    rng = np.random.default_rng(seed + 1)
+    return pd.DataFrame({
+        "STATIONS_ID": np.full(n, station_id, dtype=np.int32),
+        "MESS_DATUM": pd.date_range(start, periods=n, freq="10min").to_numpy(),
+        "  QN_wind": np.full(n, 3, dtype=np.float32),
+        "FF_10_wind": wind_speeds(n, seed=seed).astype(np.float32),
+        "DD_10_wind": (rng.integers(0, 37, n) * 10).astype(np.float32),
+        "eor_wind": pd.Categorical(np.full(n, "eor")),
+    })
+
+
+def write_dwd_archive(folder: str, years: float, station_id: int = 2115, seed: int = 0, start: str = "1970-01-01", recent: bool = False) -> str:
+    """
+    Writes a zip archive with one `produkt_zehn_min_ff_*.txt` member in the
+    DWD format (-999 for missing values) and returns its path. The archive is
+    named like the files of the "historical" directory, or like the one of
+    the "recent" directory for `recent=True`.
+    """
+    df = wind_frame(years, station_id, seed, start)
+    stamps = df["MESS_DATUM"].dt.strftime("%Y%m%d%H%M")
+    speeds = df["FF_10_wind"].fillna(-999).to_numpy()
+    lines = [f"{station_id};{s};    3;{v:6.1f};{d:4.0f};eor" for s, v, d in zip(stamps, speeds, df["DD_10_wind"].to_numpy())]
+    content = "STATIONS_ID;MESS_DATUM;  QN;FF_10;DD_10;eor\n" + "\n".join(lines) + "\n"
+
+    first, last = stamps.iloc[0][:8], stamps.iloc[-1][:8]
+    name = f"10minutenwerte_wind_{station_id:05d}_akt" if recent else f"10minutenwerte_wind_{station_id:05d}_{first}_{last}_hist"
+    path = os.path.join(folder, f"{name}.zip")
+    _write_zip(path, { f"produkt_zehn_min_ff_{first}_{last}_{station_id:05d}.txt": content })
+    return path
+
+
+def _write_zip(path: str, members: dict):
+    # fixed member dates, so the same content always gives the same archive
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        for name, content in members.items():
+            zip_file.writestr(zipfile.ZipInfo(name, date_time=(2000, 1, 1, 0, 0, 0)), content)
+
+
+def write_dwd_tree(folder: str, station_ids: list = [2115, 183], days: int = 4, overlap: int = 1, start: str = "2000-01-01") -> str:
+    """
+    Writes a small copy of the DWD tree of the 10-minute wind product to
+    `folder/wind`: a description pdf, a meta data archive per station in
+    `meta_data/`, a historical archive of `days` days per station in
+    `historical/` and a recent archive in `recent/` which starts `overlap`
+    days before the historical one ends. Returns the folder of the metric.
+    """
+    metric_folder = os.path.join(folder, "wind")
+    for period in ["historical", "recent", "meta_data"]:
+        os.makedirs(os.path.join(metric_folder, period), exist_ok=True)
+    with open(os.path.join(metric_folder, "DESCRIPTION_obsgermany_climate_10min_wind_en.pdf"), "wb") as fh:
+        fh.write(b"%PDF-1.4\n% synthetic description\n")
+
+    recent_start = str((pd.Timestamp(start) + pd.Timedelta(days=days - overlap)).date())
+    for i, station_id in enumerate(station_ids):
+        write_dwd_archive(os.path.join(metric_folder, "historical"), days / 365, station_id, seed=2 * i, start=start)
+        write_dwd_archive(os.path.join(metric_folder, "recent"), days / 365, station_id, seed=2 * i + 1, start=recent_start, recent=True)
+        meta = f"Stations_id;Stationshoehe;Geogr.Breite;Geogr.Laenge;von_datum;bis_datum;Stationsname\n{station_id};4;54.1750;7.8920;19900101;;Synthetic\n"
+        _write_zip(os.path.join(metric_folder, "meta_data", f"Meta_Daten_zehn_min_ff_{station_id:05d}.zip"), { f"Metadaten_Geographie_{station_id:05d}.txt": meta })
+    return metric_folder
+
+
+def write_eca_series(folder: str, years: float, station_id: int = 32, seed: int = 0) -> str:
+    """
+    Writes an ECA&D daily wind speed series (FG in 0.1 m/s, quality 9 for
+    missing values) with the free text preamble and returns its path.
+    """
+    n = max(int(years * 365), 1)
+    dates = pd.date_range("1970-01-01", periods=n, freq="D").strftime("%Y%m%d")
+    speeds = wind_speeds(n, seed=seed)
+    quality = np.where(np.isnan(speeds), 9, 0)
+    values = np.where(np.isnan(speeds), -9999, np.nan_to_num(speeds) * 10).astype(int)
+    lines = [f"{station_id:6d},{100000 + station_id:6d},{d},{v:5d},{q:5d}" for d, v, q in zip(dates, values, quality)]
+    preamble = ["EUROPEAN CLIMATE ASSESSMENT & DATASET (ECA&D), synthetic file", "", "FILE FORMAT (MISSING VALUE CODE IS -9999):", ""]
+    content = "\n".join(preamble + [" STAID, SOUID,    DATE,   FG, Q_FG"] + lines) + "\n"
+
+    path = os.path.join(folder, f"FG_SOUID{100000 + station_id}.txt")
+    with open(path, "w", encoding="latin-1") as fh:
+        fh.write(content)
+    return path
@@ -1,7 +1,10 @@
+import os
+import concurrent.futures
 import plotly.graph_objects as go
 import pandas as pd 
 import numpy as np 
 import plotly.express as px
+from parse import parse_timestamps
 
 
 def get_violin(df, interval):
@@ -21,38 +24,59 @@ def get_violin(df, interval):
 
     return fig
 
+# explicit types of the ECA&D series files, the value column (e.g. FG) and its quality flag are added per file
+DTYPES = {
+    "STAID": "int32",
+    "SOUID": "int32",
+    "DATE": "int64",
+}
+VALUE_DTYPE = "int32"
+QUALITY_DTYPE = "int8"
+MISSING_QUALITY = 9
+
+
+def header_offset(path: str) -> tuple:
+    """
+    Finds the column header below the free text preamble of an ECA&D file.
+    Returns the number of lines before the header and the column names.
+    """
+    with open(path, "r", encoding="latin-1") as file:
+        for i, line in enumerate(file):
+            if line.lstrip().startswith("STAID"):
+                return i, [c.strip() for c in line.split(",")]
+    raise ValueError(f"{path} has no `STAID, ...` header line")
+
+
+def read_series(path: str, keep_missing: bool = False) -> pd.DataFrame:
+    """
+    Reads an ECA&D series file (e.g. FG_SOUID115639.txt) with a single
+    vectorized CSV pass. Returns the columns STAID, SOUID, DATE (datetime64),
+    the value column (e.g. FG) and its quality flag (e.g. Q_FG); rows flagged
+    as missing (quality 9) are dropped unless `keep_missing`.
+    """
+    offset, header = header_offset(path)
+    value, quality = header[3], header[4]
+    dtypes = dict(DTYPES, **{ value: VALUE_DTYPE, quality: QUALITY_DTYPE })
+    df = pd.read_csv(
+        path, skiprows=offset + 1, names=header, header=None, dtype=dtypes,
+        skipinitialspace=True, encoding="latin-1",
+    )
+    if not keep_missing:
+        df = df[df[quality].to_numpy() != MISSING_QUALITY].reset_index(drop=True)
+    df["DATE"] = parse_timestamps(df["DATE"].to_numpy() * 10_000)
+    return df
+
+
 def load_dataset(path, ma_window=7, max_window=30, is_random=False):
-    df = pd.DataFrame()
-    df = pd.DataFrame(columns=['SPEED', 'YEAR', 'MONTH', 'DAY', 'DECADE'])
-    # df = pd.DataFrame(columns=['STAID', 'SOUID','DATE','FG','Q_FG'])
-    star_parsing = False 
-    with open(path, "r") as file:
-        ith_row = 0
-        while True:
-            line = file.readline() 
-            
-            if len(line) == 0:
-                break
-
-            elif line.startswith(' STAID, SOUID,    DATE,   FG, Q_FG'):
-                star_parsing = True
-            elif star_parsing:
-                fields = line.rstrip().strip().split(',')
-
-                STAID = fields[0]
-                SOUID = fields[1]
-                DATE = fields[2]
-                FG = int(fields[3])
-                Q_FG = fields[4]
-                YEAR = int(DATE[0:4])
-                MONTH = int(DATE[4:6])
-                DAY = int(DATE[6:8])
-                DECADE = int(str(YEAR)[0:-1] + '0')
-
-                if int(Q_FG) != 9:
-                    # df.loc[ith_row] = [STAID, SOUID, DATE, FG, Q_FG]
-                    df.loc[ith_row] = [FG, YEAR, MONTH, DAY, DECADE]
-                    ith_row += 1
+    series = read_series(path)
+    date = series["DATE"].dt
+    df = pd.DataFrame({
+        'SPEED': series['FG'].to_numpy(),
+        'YEAR': date.year.to_numpy(),
+        'MONTH': date.month.to_numpy(),
+        'DAY': date.day.to_numpy(),
+        'DECADE': date.year.to_numpy() // 10 * 10,
+    })
 
     if is_random:
         df = df.sample(frac=1, random_state=42).reset_index(drop=True)
@@ -64,4 +88,45 @@ def load_dataset(path, ma_window=7, max_window=30, is_random=False):
 
 
     return df
-    
\ No newline at end of file
+
+
+def _write_station(path: str, dataset_folder: str) -> pd.DataFrame:
+    """
+    Parses one file and, if `dataset_folder` is given, writes it to
+    `dataset_folder/station=<STAID>/<file name>.parquet`. Runs in a worker process.
+    """
+    df = read_series(path)
+    if dataset_folder is not None and len(df) > 0:
+        station_folder = os.path.join(dataset_folder, f"station={df['STAID'].iloc[0]}")
+        os.makedirs(station_folder, exist_ok=True)
+        name = os.path.splitext(os.path.basename(path))[0]
+        df.to_parquet(os.path.join(station_folder, f"{name}.parquet"), index=False)
+    return df
+
+
+def load_stations(paths: list, dataset_folder: str = None, max_processes: int = None) -> pd.DataFrame:
+    """
+    Parses many ECA&D series files in parallel worker processes and returns
+    them as one table sorted by station and date. With `dataset_folder` the
+    files are also stored as a Parquet dataset partitioned by station, which
+    `read_stations` reads back.
+    """
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_processes) as pool:
+        dfs = list(pool.map(_write_station, paths, [dataset_folder] * len(paths)))
+    df = pd.concat(dfs, ignore_index=True)
+    return df.sort_values(["STAID", "DATE"], kind="stable", ignore_index=True)
+
+
+def read_stations(dataset_folder: str, station_ids: list = None, columns: list = None) -> pd.DataFrame:
+    """
+    Reads the stored files of the given stations (default: all) from a dataset written by `load_stations`.
+    """
+    files = []
+    for partition in sorted(os.listdir(dataset_folder)):
+        station = int(partition.removeprefix("station="))
+        if station_ids is None or station in station_ids:
+            folder = os.path.join(dataset_folder, partition)
+            files += [os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.endswith(".parquet")]
+    if len(files) == 0:
+        return pd.DataFrame(columns=columns)
+    return pd.concat([pd.read_parquet(file, columns=columns) for file in files], ignore_index=True)
@@ -0,0 +1,189 @@
+'''
+Command-line batch runner: downloads and partitions the data of many
+stations (see `MultiLoader`), fits the Weibull parameters of every period
+with one process pool task per station-year, and runs the homogeneity tests
+on the fitted parameter series of every station.
+
+    python util/batch.py --stations 02115 00183 --start 2000 --end 2020 --freq month
+
+The results are written as Parquet files to a folder of `--output` named
+after the run configuration (column, granularity and methods, e.g.
+`FF_10_wind_month_epf+ml`):
+- params/<station>_<year>.parquet: parameters, number of values and fit
+  metrics (see `ParamStore.params`) per period and estimator method
+- homogeneity.parquet: SNHT and Pettitt test of the lambda and beta series
+  of every station and method
+
+A rerun with the same configuration skips the station-years whose result
+file is newer than their data partition, so an interrupted run continues
+where it stopped. A run with another configuration fits everything again
+in its own folder.
+'''
+
+import os
+import sys
+import argparse
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from multistation import MultiLoader
+from paramstore import ParamStore
+from timeindex import TimeIndex, FREQS
+from weibull import Weibull
+import homogeneity
+
+PARAMETERS = ["param_lambda", "param_beta"]
+TESTS = ["snht", "pettitt"]
+
+
+def partition_path(dataset_folder: str, station: str, year: int) -> str:
+    return os.path.join(dataset_folder, f"station={station}", f"year={year}", "part.parquet")
+
+
+def run_folder(output: str, column: str, freq: str, methods: list) -> str:
+    """
+    The folder of the results of one run configuration.
+    """
+    return os.path.join(output, f"{column.strip()}_{freq}_{'+'.join(sorted(methods))}")
+
+
+def result_path(folder: str, station: str, year: int) -> str:
+    return os.path.join(folder, "params", f"{station}_{year}.parquet")
+
+
+def is_done(dataset_folder: str, folder: str, station: str, year: int) -> bool:
+    """
+    A task is done if its result (in the `run_folder` of the configuration)
+    exists and was written after its data partition.
+    """
+    result = result_path(folder, station, year)
+    return os.path.isfile(result) and os.path.getmtime(result) >= os.path.getmtime(partition_path(dataset_folder, station, year))
+
+
+def fit_station_year(dataset_folder: str, folder: str, station: str, year: int, column: str, freq: str, methods: list) -> int:
+    """
+    Fits all periods of one station-year with every method and writes the
+    result file atomically. Returns the number of rows written. Runs in a
+    worker process.
+    """
+    df = pd.read_parquet(partition_path(dataset_folder, station, year), columns=["MESS_DATUM", column])
+    index = TimeIndex(df["MESS_DATUM"].to_numpy())
+    values = df[column].to_numpy(dtype=float)
+    store = ParamStore()
+    tables = []
+    for method in methods:
+        params = store.params(station, index, values, freq, method, start=year, end=year)
+        params.insert(0, "period", params.index.astype(str))
+        params.insert(0, "method", method)
+        tables.append(params.reset_index(drop=True))
+    result = pd.concat(tables, ignore_index=True)
+    result.insert(0, "year", year)
+    result.insert(0, "station", station)
+
+    path = result_path(folder, station, year)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    result.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return len(result)
+
+
+def test_homogeneity(params: pd.DataFrame) -> pd.DataFrame:
+    """
+    SNHT and Pettitt test of the parameter series (in period order) of every station and method.
+    Periods without a fit are left out.
+    """
+    rows = []
+    for (station, method), df in params.groupby(["station", "method"], sort=True):
+        df = df.sort_values("period")
+        for parameter in PARAMETERS:
+            series = df[df[parameter] > 0]
+            if len(series) < 3:
+                continue
+            X = series[parameter].to_numpy(dtype=float)
+            for test in TESTS:
+                kwargs = { "n_permutations": 1000, "max_workers": 1 } if test == "snht" else {}
+                result = getattr(homogeneity, test)(X, **kwargs)
+                rows.append({
+                    "station": station, "method": method, "parameter": parameter, "test": test,
+                    "change_point": series["period"].iloc[int(result.change_point)],
+                    "statistic": float(result.max_statistic), "p_value": float(result.p_value),
+                })
+    return pd.DataFrame(rows, columns=["station", "method", "parameter", "test", "change_point", "statistic", "p_value"])
+
+
+def run(stations: list, metrics: list, start: int, end: int, freq: str = "month", methods: list = ["ml"], column: str = "FF_10_wind",
+        data_folder: str = "data", output: str = "results", periods: list = ["historical"], max_processes: int = None,
+        download: bool = True, reset: bool = False, base_url: str = None) -> dict:
+    """
+    Runs the whole batch, see the module description. `base_url` can point to
+    a mirror (or a local copy) of the DWD tree. Returns the number of fitted,
+    skipped and failed tasks.
+    """
+    loader = MultiLoader(metrics, data_folder, stations, base_url=base_url, periods=periods, max_processes=max_processes)
+    folder = run_folder(output, column, freq, methods)
+    if download:
+        loader.load()
+
+    tasks, skipped = [], 0
+    for station in loader.station_ids:
+        for year in range(start, end + 1):
+            if not os.path.isfile(partition_path(loader.dataset_folder, station, year)):
+                continue
+            if not reset and is_done(loader.dataset_folder, folder, station, year):
+                skipped += 1
+            else:
+                tasks.append((station, year))
+    print(f"{len(tasks)} station-years to fit, {skipped} already done")
+
+    failed = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_processes) as pool:
+        futures = {
+            pool.submit(fit_station_year, loader.dataset_folder, folder, station, year, column, freq, methods): (station, year)
+            for station, year in tasks
+        }
+        for i, future in enumerate(concurrent.futures.as_completed(futures)):
+            station, year = futures[future]
+            try:
+                future.result()
+                print(f"[{i + 1}/{len(tasks)}] station {station}, {year}")
+            except Exception as e:
+                # the other tasks go on, a rerun retries the failed ones
+                failed += 1
+                print(f"[{i + 1}/{len(tasks)}] station {station}, {year} failed: {e!r}", file=sys.stderr)
+
+    files = [result_path(folder, station, year) for station in loader.station_ids for year in range(start, end + 1)]
+    files = [file for file in files if os.path.isfile(file)]
+    if len(files) > 0:
+        params = pd.concat([pd.read_parquet(file) for file in files], ignore_index=True)
+        test_homogeneity(params).to_parquet(os.path.join(folder, "homogeneity.parquet"), index=False)
+    return { "fitted": len(tasks) - failed, "skipped": skipped, "failed": failed }
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Fits the Weibull parameters and runs the homogeneity tests for many stations.")
+    parser.add_argument("--stations", nargs="+", required=True, help="DWD station ids, e.g. 02115")
+    parser.add_argument("--metrics", nargs="+", default=["wind"], help="DWD metrics to load, e.g. wind air_temperature")
+    parser.add_argument("--start", type=int, required=True, help="first year")
+    parser.add_argument("--end", type=int, required=True, help="last year")
+    parser.add_argument("--freq", default="month", choices=list(FREQS), help="granularity of the fitted periods")
+    parser.add_argument("--methods", nargs="+", default=["ml"], choices=Weibull.METHODS)
+    parser.add_argument("--column", default="FF_10_wind", help="column of the wind speeds")
+    parser.add_argument("--periods", nargs="+", default=["historical"], help="DWD directories: historical, recent and/or now")
+    parser.add_argument("--base-url", default=None, help="mirror (or local copy) of the DWD 10-minute directory tree")
+    parser.add_argument("--data-folder", default="data")
+    parser.add_argument("--output", default="results")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--no-download", action="store_true", help="only use the already partitioned data")
+    parser.add_argument("--reset", action="store_true", help="refit all station-years")
+    args = parser.parse_args(argv)
+
+    summary = run(
+        args.stations, args.metrics, args.start, args.end, args.freq, args.methods, args.column,
+        args.data_folder, args.output, args.periods, args.processes, not args.no_download, args.reset, args.base_url,
+    )
+    print(f"fitted {summary['fitted']}, skipped {summary['skipped']}, failed {summary['failed']}")
+    return 1 if summary["failed"] > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
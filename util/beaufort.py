@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+from timeindex import TimeIndex
+
+# lower bounds (exclusive, in m/s) of the Beaufort classes 1 to 10
+THRESHOLDS = np.array([0.3, 1.6, 3.4, 5.5, 8.0, 10.8, 13.9, 17.2, 20.8, 24.5])
+CLASSES = np.arange(len(THRESHOLDS) + 1)
+MISSING = -1
+
+
+def classify(speeds, missing: int = MISSING) -> np.ndarray:
+    """
+    Beaufort class of every wind speed (m/s) as int8, `missing` for NaN values.
+    A speed belongs to the highest class whose lower bound it exceeds.
+    """
+    speeds = np.asarray(speeds, dtype=float)
+    return np.where(np.isnan(speeds), missing, np.searchsorted(THRESHOLDS, speeds, side="left")).astype(np.int8)
+
+
+def _bucket_classes(index: TimeIndex, speeds, freq: str, start, end) -> tuple:
+    # the classes and timestamps of the sorted rows in the requested buckets and the bucket of every row
+    codes, offsets = index.buckets(freq, start, end)
+    classes = classify(index.take(speeds)[offsets[0]:offsets[-1]])
+    stamps = index.stamps[offsets[0]:offsets[-1]]
+    bucket = np.repeat(np.arange(len(codes)), np.diff(offsets))
+    return codes, classes, stamps, bucket
+
+
+def class_frequencies(index: TimeIndex, speeds, freq: str = "month", start=None, end=None, normalize: bool = False) -> pd.DataFrame:
+    """
+    Number of values (or with `normalize` the share) of every Beaufort class
+    in every year, month or day (see `TimeIndex.buckets`), computed with a
+    single bincount over (bucket, class) pairs. Missing values are not counted.
+    """
+    codes, classes, _, bucket = _bucket_classes(index, speeds, freq, start, end)
+    valid = classes != MISSING
+    counts = np.bincount(bucket[valid] * len(CLASSES) + classes[valid], minlength=len(codes) * len(CLASSES))
+    table = pd.DataFrame(counts.reshape(len(codes), len(CLASSES)), index=index.labels(freq, codes), columns=pd.Index(CLASSES, name="beaufort"))
+    if normalize:
+        with np.errstate(invalid="ignore"):
+            table = table.div(table.sum(axis=1), axis=0)
+    return table
+
+
+def exceedance_durations(index: TimeIndex, speeds, freq: str = "month", start=None, end=None, step=None) -> pd.DataFrame:
+    """
+    For every period and Beaufort class k >= 1 the time during which the
+    class was at least k: the total duration, the number of events
+    (uninterrupted runs of consecutive measurements) and the longest event.
+    Runs end at missing values, gaps in the timestamps and period bounds.
+    `step` is the measurement interval (default: the most common one).
+    Returns a tidy table with the columns period, beaufort, duration,
+    events and longest.
+    """
+    codes, classes, stamps, bucket = _bucket_classes(index, speeds, freq, start, end)
+    gaps = np.diff(stamps)
+    if step is None:
+        values, counts = np.unique(gaps, return_counts=True)
+        step = values[counts.argmax()] if len(values) > 0 else np.timedelta64(10, "m")
+    step = pd.Timedelta(step).to_timedelta64()
+    # whether a row directly continues the previous one
+    continues = np.concatenate([[False], (gaps == step) & (bucket[1:] == bucket[:-1])])
+
+    rows = []
+    for k in CLASSES[1:]:
+        exceeds = classes >= k
+        run_start = exceeds & ~(continues & np.concatenate([[False], exceeds[:-1]]))
+        run_bucket = bucket[run_start]
+        # the length of every run, the runs are ordered by bucket
+        run_length = np.bincount(np.cumsum(run_start)[exceeds] - 1, minlength=len(run_bucket))
+        events = np.bincount(run_bucket, minlength=len(codes))
+        total = np.bincount(bucket[exceeds], minlength=len(codes))
+        longest = np.zeros(len(codes), dtype=np.int64)
+        filled = events > 0
+        if filled.any():
+            longest[filled] = np.maximum.reduceat(run_length, np.searchsorted(run_bucket, np.flatnonzero(filled)))
+        rows.append(pd.DataFrame({
+            "period": index.labels(freq, codes), "beaufort": k,
+            "duration": total * step, "events": events, "longest": longest * step,
+        }))
+    return pd.concat(rows, ignore_index=True)
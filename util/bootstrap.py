@@ -0,0 +1,121 @@
+import os
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from weibull import Weibull
+from timeindex import TimeIndex
+from energy import power_density
+
+QUANTITIES = ["lambda", "beta", "power_density"]
+# upper bound of the number of array elements of a single batched refit
+MAX_BATCH_ELEMENTS = 1 << 22
+
+
+def quantize(X: np.ndarray, offsets: np.ndarray, resolution: float = 0.1) -> list:
+    """
+    Reduces every group X[offsets[i]:offsets[i+1]] to its distinct values
+    (multiples of `resolution`, NaN values are dropped) and their counts.
+    Returns a list of (values, counts) per group.
+    """
+    X = np.asarray(X, dtype=float)
+    offsets = np.asarray(offsets)
+    group = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    valid = ~np.isnan(X)
+    codes = np.rint(np.maximum(X[valid], 0) / resolution).astype(np.int64)
+    group = group[valid]
+    # one sort over (group, value) pairs instead of one per group
+    n_codes = codes.max() + 1 if len(codes) > 0 else 1
+    keys, counts = np.unique(group * n_codes + codes, return_counts=True)
+    key_group, key_code = np.divmod(keys, n_codes)
+    bounds = np.searchsorted(key_group, np.arange(len(offsets)))
+    return [(key_code[a:b] * resolution, counts[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def _resample_groups(groups: list, n_resamples: int, seeds: list) -> tuple:
+    """
+    Draws `n_resamples` multinomial count vectors over the distinct values
+    of every group and refits all of them with batched weighted ML
+    estimates. Runs in a worker process. Returns the arrays (lambda, beta)
+    of shape (len(groups), n_resamples).
+    """
+    lambd = np.full((len(groups), n_resamples), -999.0)
+    beta = np.full((len(groups), n_resamples), -999.0)
+    for i, ((values, counts), seed) in enumerate(zip(groups, seeds)):
+        n, k = counts.sum(), len(values)
+        if n == 0:
+            continue
+        rng = np.random.default_rng(seed)
+        resampled = rng.multinomial(n, counts / n, size=n_resamples)
+        # the resamples share the distinct values, only their counts differ
+        batch = max(1, MAX_BATCH_ELEMENTS // k)
+        for start in range(0, n_resamples, batch):
+            weights = resampled[start:start + batch]
+            offsets = np.arange(len(weights) + 1) * k
+            l, b = Weibull.ml_batch(np.tile(values, len(weights)), offsets, weights=weights.ravel())
+            lambd[i, start:start + len(weights)], beta[i, start:start + len(weights)] = l, b
+    return lambd, beta
+
+
+def bootstrap_batch(X: np.ndarray, offsets: np.ndarray, n_resamples: int = 1000, resolution: float = 0.1, seed: int = 0, max_workers: int = None) -> tuple:
+    """
+    Nonparametric bootstrap of the ML estimates of many samples, the i-th
+    sample is X[offsets[i]:offsets[i+1]]. Returns the point estimates
+    (lambda, beta) and the resampled estimates of shape (n_groups,
+    n_resamples), -999 marks resamples without a fit. Every group draws from
+    its own random stream derived from `seed`, so the result does not depend
+    on `max_workers`.
+    """
+    groups = quantize(X, offsets, resolution)
+    seeds = np.random.SeedSequence(seed).spawn(len(groups))
+    values = np.concatenate([g[0] for g in groups]) if len(groups) > 0 else np.zeros(0)
+    counts = np.concatenate([g[1] for g in groups]) if len(groups) > 0 else np.zeros(0)
+    estimate = Weibull.ml_batch(values, np.concatenate([[0], np.cumsum([len(g[0]) for g in groups])]), weights=counts)
+
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(groups)))
+    if max_workers == 1:
+        resampled = _resample_groups(groups, n_resamples, seeds)
+    else:
+        # contiguous chunks of groups with about the same number of distinct values
+        sizes = np.cumsum([len(g[0]) for g in groups])
+        bounds = np.searchsorted(sizes, np.linspace(0, sizes[-1], max_workers + 1)[1:-1], side="right")
+        chunks = np.split(np.arange(len(groups)), bounds)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(_resample_groups, [groups[i] for i in chunk], n_resamples, [seeds[i] for i in chunk]) for chunk in chunks if len(chunk) > 0]
+            results = [future.result() for future in futures]
+        resampled = tuple(np.concatenate([r[j] for r in results]) for j in range(2))
+    return estimate, resampled
+
+
+def _interval_rows(labels, quantity: str, estimate: np.ndarray, resampled: np.ndarray, n: np.ndarray, alpha: float) -> pd.DataFrame:
+    with np.errstate(invalid="ignore"):
+        resampled = np.where(np.isfinite(resampled) & (resampled > 0), resampled, np.nan)
+        estimate = np.where(estimate > 0, estimate, np.nan)
+    valid = ~np.isnan(resampled).all(axis=1)
+    lower, upper, std = (np.full(len(estimate), np.nan) for _ in range(3))
+    if valid.any():
+        lower[valid], upper[valid] = np.nanquantile(resampled[valid], [alpha / 2, 1 - alpha / 2], axis=1)
+        std[valid] = np.nanstd(resampled[valid], axis=1)
+    return pd.DataFrame({
+        "period": labels, "quantity": quantity, "estimate": estimate,
+        "lower": lower, "upper": upper, "std": std, "n": n,
+    })
+
+
+def bootstrap_intervals(index: TimeIndex, values, freq: str = "month", start=None, end=None, n_resamples: int = 1000, alpha: float = 0.05, resolution: float = 0.1, seed: int = 0, max_workers: int = None) -> pd.DataFrame:
+    """
+    Percentile bootstrap intervals (level 1 - alpha) of lambda, beta and the
+    power density (see `energy.power_density`) of every period (see
+    `TimeIndex.buckets`). Returns a tidy table with one row per period and
+    quantity and the columns period, quantity, estimate, lower, upper, std
+    (of the resampled estimates) and n (number of values).
+    """
+    codes, offsets = index.buckets(freq, start, end)
+    X = np.asarray(index.take(values)[offsets[0]:offsets[-1]], dtype=float)
+    offsets = offsets - offsets[0]
+    (lambd, beta), (lambd_s, beta_s) = bootstrap_batch(X, offsets, n_resamples, resolution, seed, max_workers)
+
+    labels = index.labels(freq, codes)
+    n = np.diff(np.concatenate([[0], np.cumsum(~np.isnan(X))])[offsets])
+    estimates = { "lambda": (lambd, lambd_s), "beta": (beta, beta_s), "power_density": (power_density(lambd, beta), power_density(lambd_s, beta_s)) }
+    rows = [_interval_rows(labels, quantity, *estimates[quantity], n, alpha) for quantity in QUANTITIES]
+    return pd.concat(rows, ignore_index=True)
@@ -0,0 +1,102 @@
+import os
+import json
+import hashlib
+import importlib.util
+import pandas as pd
+
+# the parquet engine is looked up without importing it, pandas loads it on the first read or write
+HAS_PARQUET = importlib.util.find_spec("pyarrow") is not None
+
+
+class FrameCache:
+    """
+    Persistent Parquet cache of parsed data frames. Entries are addressed by a
+    key derived from the manifest entries they were built from, so a change of
+    the source archives leads to a different key and the stale entry is never
+    read again. Every entry records the checksums of its source archives next
+    to it, `prune` removes the entries whose sources are no longer in the
+    manifest. Loaders of different metrics or periods share the cache, the
+    entries one of them does not use are left alone.
+    """
+    VERSION = 2
+
+    def __init__(self, folder: str):
+        self.folder = folder
+
+    @property
+    def enabled(self) -> bool:
+        return HAS_PARQUET
+
+    def key(self, *parts) -> str:
+        """
+        Hashes the json representation of `parts` (e.g. manifest entries) into a cache key.
+        """
+        content = json.dumps([self.VERSION, parts], sort_keys=True, default=str)
+        return hashlib.sha256(content.encode()).hexdigest()[:32]
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.folder, f"{key}.parquet")
+
+    def sources_path(self, key: str) -> str:
+        return os.path.join(self.folder, f"{key}.json")
+
+    def get(self, key: str) -> pd.DataFrame:
+        """
+        Returns the cached frame for `key` or None if there is no (readable) entry.
+        """
+        if not self.enabled or not os.path.isfile(self.path(key)):
+            return None
+        try:
+            return pd.read_parquet(self.path(key))
+        except Exception:
+            # a broken entry (e.g. from an interrupted write) is rebuilt
+            os.remove(self.path(key))
+            return None
+
+    def put(self, key: str, df: pd.DataFrame, sources: list = []):
+        """
+        Stores `df` under `key`, `sources` are the checksums of the archives it was built from.
+        """
+        if not self.enabled:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        # the sources are written first, an entry without them counts as stale
+        with open(self.sources_path(key) + ".tmp", "w") as fh:
+            json.dump(sorted(set(sources)), fh)
+        os.replace(self.sources_path(key) + ".tmp", self.sources_path(key))
+        tmp_path = self.path(key) + ".tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.path(key))
+
+    def _sources(self, key: str) -> list:
+        try:
+            with open(self.sources_path(key), "r") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _remove(self, key: str):
+        for path in [self.path(key), self.sources_path(key)]:
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def prune(self, checksums: set):
+        """
+        Deletes all entries built from an archive whose checksum is not in
+        `checksums` (the archives of the manifest).
+        """
+        if not os.path.isdir(self.folder):
+            return
+        keys = { os.path.splitext(filename)[0] for filename in os.listdir(self.folder) if filename.endswith((".parquet", ".json")) }
+        for key in keys:
+            sources = self._sources(key)
+            if sources is None or not os.path.isfile(self.path(key)) or any(s not in checksums for s in sources):
+                self._remove(key)
+
+    def clear(self):
+        """
+        Deletes all entries.
+        """
+        if os.path.isdir(self.folder):
+            for filename in os.listdir(self.folder):
+                os.remove(os.path.join(self.folder, filename))
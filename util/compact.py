@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+from timeindex import TimeIndex
+from weibull import WeibullAccumulator
+
+# measurements are stored as int16 multiples of the first of these steps that
+# represents all their values, e.g. 0.1 m/s for FF_10 and 1 degree for DD_10
+SCALES = [1.0, 0.1]
+SCALED_DTYPE = np.int16
+SCALED_MISSING = np.iinfo(SCALED_DTYPE).min
+FLAG_DTYPE = np.uint8
+FLAG_MISSING = np.iinfo(FLAG_DTYPE).max
+MEASUREMENT_DTYPE = np.float32
+# the timestamps are stored as minutes after the first one
+STAMP_DTYPE = np.int32
+KEYS = ["STATIONS_ID", "MESS_DATUM"]
+
+
+# the DWD headers pad some names with spaces, e.g. `  QN`, so the names are compared stripped
+def is_flag(column: str) -> bool:
+    column = column.strip()
+    return column == "QN" or column.startswith("QN_")
+
+
+def is_end_of_record(column: str) -> bool:
+    column = column.strip()
+    return column == "eor" or column.startswith("eor_")
+
+
+def _scale_of(values: np.ndarray):
+    """
+    The first step of SCALES on which all (non NaN) values lie and whose
+    multiples fit into SCALED_DTYPE, or None.
+    """
+    values = values[~np.isnan(values)].astype(float)
+    limit = np.iinfo(SCALED_DTYPE).max
+    for scale in SCALES:
+        codes = np.rint(values / scale)
+        # float32 values are only exact up to their relative precision
+        tolerance = np.maximum(np.abs(values), 1) * np.finfo(np.float32).eps * 4
+        if np.all(np.abs(codes * scale - values) <= tolerance) and np.all(np.abs(codes) < limit):
+            return scale
+    return None
+
+
+def _encode(values: np.ndarray, column: str) -> tuple:
+    """
+    Returns the compact array of a column and its scale (None if the values are stored as they are).
+    """
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    if is_flag(column):
+        if np.any((values[~missing] < 0) | (values[~missing] >= FLAG_MISSING) | (values[~missing] % 1 != 0)):
+            raise ValueError(f"the quality flags of `{column}` have to be integers from 0 to {FLAG_MISSING - 1}")
+        return np.where(missing, FLAG_MISSING, values).astype(FLAG_DTYPE), None
+    scale = _scale_of(values)
+    if scale is None:
+        return values.astype(MEASUREMENT_DTYPE), None
+    return np.where(missing, SCALED_MISSING, np.rint(values / scale)).astype(SCALED_DTYPE), scale
+
+
+class CompactFrame:
+    """
+    Compact in-memory representation of the joint dataframe of one station
+    (see `Loader.as_dataframe`). The station id is stored once, the
+    timestamps as int32 minutes, quality flags as uint8, measurements on a
+    fixed grid (speeds, directions, ...) as scaled int16 and all other
+    measurements as float32. End-of-record columns are dropped. The raw
+    arrays are available without copies through `codes` and `values`.
+    """
+
+    def __init__(self, station_id: int, origin, minutes: np.ndarray, columns: dict, scales: dict):
+        """
+        origin is the first timestamp, minutes the offsets of all rows from it
+        columns maps column names to their compact arrays, scales maps the
+        scaled int16 columns to their step
+        """
+        self.station_id = station_id
+        self.origin = np.datetime64(origin, "m")
+        self.minutes = minutes
+        self.columns = columns
+        self.scales = scales
+
+    def __repr__(self):
+        return "CompactFrame(station=%s, rows=%s, columns=%s, %.1f MB)" % (self.station_id, len(self), list(self.columns), self.nbytes / 1e6)
+
+    def __len__(self):
+        return len(self.minutes)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame):
+        """
+        Converts the frame of a single station (e.g. `Loader.as_dataframe[1]`).
+        """
+        station_ids = pd.unique(df["STATIONS_ID"].to_numpy())
+        if len(station_ids) > 1:
+            raise ValueError("a CompactFrame holds the data of a single station, got stations %s (see `split_stations`)" % list(station_ids))
+        station_id = int(station_ids[0]) if len(station_ids) > 0 else 0
+
+        stamps = df["MESS_DATUM"].to_numpy().astype("datetime64[m]")
+        origin = stamps[0] if len(stamps) > 0 else np.datetime64(0, "m")
+        offsets = (stamps - origin).astype(np.int64)
+        if len(offsets) > 0 and (offsets.min() < np.iinfo(STAMP_DTYPE).min or offsets.max() > np.iinfo(STAMP_DTYPE).max):
+            raise ValueError("the timestamps span more than the int32 range of minutes")
+
+        columns, scales = {}, {}
+        for column in df.columns:
+            if column in KEYS or is_end_of_record(column):
+                continue
+            columns[column], scale = _encode(df[column].to_numpy(dtype=float, na_value=np.nan), column)
+            if scale is not None:
+                scales[column] = scale
+        return cls(station_id, origin, offsets.astype(STAMP_DTYPE), columns, scales)
+
+    @property
+    def stamps(self) -> np.ndarray:
+        return (self.origin + self.minutes.astype("timedelta64[m]")).astype("datetime64[ns]")
+
+    @property
+    def nbytes(self) -> int:
+        return self.minutes.nbytes + sum(values.nbytes for values in self.columns.values())
+
+    def codes(self, column: str) -> np.ndarray:
+        """
+        The stored array of a column without a copy (read only): int16
+        multiples of `scales[column]`, uint8 flags or float32 values.
+        """
+        view = self.columns[column].view()
+        view.flags.writeable = False
+        return view
+
+    def values(self, column: str, dtype=np.float32) -> np.ndarray:
+        """
+        The values of a column with NaN for missing values. Unscaled float32
+        columns are returned as a read only view, all others are decoded.
+        """
+        stored = self.columns[column]
+        if stored.dtype == MEASUREMENT_DTYPE and np.dtype(dtype) == MEASUREMENT_DTYPE:
+            return self.codes(column)
+        if column in self.scales:
+            return np.where(stored == SCALED_MISSING, np.nan, stored * self.scales[column]).astype(dtype)
+        if stored.dtype == FLAG_DTYPE:
+            return np.where(stored == FLAG_MISSING, np.nan, stored).astype(dtype)
+        return stored.astype(dtype)
+
+    def time_index(self) -> TimeIndex:
+        return TimeIndex(self.stamps)
+
+    def accumulator(self, column: str = "FF_10_wind", rows=slice(None)) -> WeibullAccumulator:
+        """
+        A `WeibullAccumulator` of the (positive) values of a scaled column,
+        counted directly from the int16 codes without decoding them. `rows`
+        selects e.g. one period of `TimeIndex.period`.
+        """
+        if column not in self.scales:
+            raise ValueError(f"`{column}` is not stored as scaled integers, use `WeibullAccumulator.update` on its values")
+        codes = self.columns[column][rows]
+        accumulator = WeibullAccumulator(resolution=self.scales[column])
+        accumulator._add_counts(np.bincount(codes[codes > 0]))
+        return accumulator
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Decodes the frame back into the layout of `Loader.as_dataframe` (without the end-of-record columns).
+        """
+        data = {
+            "STATIONS_ID": np.full(len(self), self.station_id, dtype=np.int32),
+            "MESS_DATUM": self.stamps,
+        }
+        for column in self.columns:
+            data[column] = self.values(column)
+        return pd.DataFrame(data, copy=False)
+
+
+def split_stations(df: pd.DataFrame) -> dict:
+    """
+    Converts a frame with the rows of several stations into one CompactFrame per station id.
+    """
+    return { int(station_id): CompactFrame.from_dataframe(station_df) for station_id, station_df in df.groupby("STATIONS_ID", sort=True) }
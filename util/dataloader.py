@@ -1,49 +1,88 @@
 import os
-from bs4 import BeautifulSoup
-import requests as rq
 import zipfile
 import pandas as pd
-import pickle
 import functools
+from manifest import Manifest, SyncReport, file_checksum
+from cache import FrameCache
+from parse import read_product, metric_frame
+from join import align_metrics
+from timeindex import TimeIndex
+from compact import CompactFrame
+from instrument import traced, annotate
+from listing import ListingCache
 
-class Loader:
+class DWDClient:
+    """
+    Access to the DWD server (or a mirror of it) shared by `Loader` and
+    `MultiLoader`. Subclasses set `data_folder`, `max_workers` and `listing_ttl`.
+    """
+
+    @functools.cached_property
+    def downloader(self):
+        """
+        The `Downloader`, created (and the HTTP libraries imported) on first use.
+        """
+        from download import Downloader
+        return Downloader(max_workers=self.max_workers)
+
+    @functools.cached_property
+    def listings(self) -> ListingCache:
+        """
+        The directory listings, shared on disk with every loader of the same `data_folder`.
+        """
+        return ListingCache(self.downloader, os.path.join(self.data_folder, "listings"), self.listing_ttl)
+
+
+class Loader(DWDClient):
     ZIP_NAME = "data.zip"
     DATA_BASE_URL = "https://opendata.dwd.de/climate_environment/CDC/observations_germany/climate/10_minutes"
     # KINDS = ["wind", "air_temperature", "precipitation", "solar"]
+    # PERIODS = ["historical", "recent", "now"]
 
-    def __init__(self, metrics: list, data_folder: str, station_id: str = "02115"):
+    def __init__(self, metrics: list, data_folder: str, station_id: str = "02115", base_url: str = None, max_workers: int = 8, periods: list = ["historical"], cache: bool = True, keep_archives: bool = False, join: str = "inner", listing_ttl: float = 3600):
         """
         metrics is a list of "wind", "air_temperature", "precipitation" and/or "solar"
+        base_url can point to a mirror (or a local copy) of the DWD directory tree
+        max_workers is the number of concurrent downloads
+        periods is a list of the DWD directories "historical", "recent" and/or "now" to load data from
+        cache enables the persistent Parquet cache of parsed frames in `data_folder/cache`
+        keep_archives keeps the data zips compressed on disk and parses them without extracting
+        join is the "inner", "outer" or "asof" join of the metrics (see `join.align_metrics`)
+        listing_ttl is the number of seconds a directory listing is used before it is revalidated (see `ListingCache`)
         """
         self.station_id = station_id
         self.metrics = metrics
         self.data_folder = data_folder
-        self.contents_path = os.path.join(data_folder, "contents.pickle")
-        self.metric_urls = { metric: f"{self.DATA_BASE_URL}/{metric}/historical/" for metric in metrics }
+        self.periods = periods
+        self.keep_archives = keep_archives
+        self.join = join
+        self.base_url = base_url.rstrip("/") if base_url else self.DATA_BASE_URL
+        self.max_workers = max_workers
+        self.listing_ttl = listing_ttl
+        self.manifest = Manifest(os.path.join(data_folder, "manifest.json"))
+        self.cache = FrameCache(os.path.join(data_folder, "cache")) if cache else None
+        self.legacy_contents_path = os.path.join(data_folder, "contents.pickle")
+        self.metric_urls = { metric: f"{self.base_url}/{metric}/historical/" for metric in metrics }
+        self.period_urls = { metric: { period: f"{self.base_url}/{metric}/{period}/" for period in periods } for metric in metrics }
 
+    @traced("loader.query_metric")
     def query_metric(self, metric) -> tuple: 
         """
-        Queries a specific metrich (such as wind) and returns dictionaries (mapping from filename to request)
+        Queries a specific metrich (such as wind) and returns dictionaries (mapping from filename to url)
         for the meta data, the descriptions and the actual data csv files.
         """
-        def seach_refs(soup, base_url, keyword) -> dict:
-            relevant_links = [a.get("href") for a in soup.find_all("a", href=True) if a.get("href").__contains__(keyword)]
-            resps = { name: rq.get(base_url + name) for name in relevant_links }
-            return resps
+        desc_listing = self.listings.get(f"{self.base_url}/{metric}/")
+        descs_d = desc_listing.urls([name for name in desc_listing.names if "pdf" in name])
 
-        url = self.metric_urls[metric]
-        desc_url = f"{self.DATA_BASE_URL}/{metric}/"
-        meta_url = f"{self.DATA_BASE_URL}/{metric}/meta_data/"
+        meta_listing = self.listings.get(f"{self.base_url}/{metric}/meta_data/")
+        meta_d = meta_listing.urls(meta_listing.files_of(self.station_id))
 
-        desc_soup = BeautifulSoup(rq.get(desc_url).text, "html.parser")
-        descs_d = seach_refs(desc_soup, desc_url, "pdf")
-
-        meta_soup = BeautifulSoup(rq.get(meta_url).text, "html.parser")
-        meta_d = seach_refs(meta_soup, meta_url, self.station_id)
-
-        data_soup = BeautifulSoup(rq.get(url).text, "html.parser")
-        csvs_d = seach_refs(data_soup, url, self.station_id)
+        csvs_d = {}
+        for url in self.period_urls[metric].values():
+            data_listing = self.listings.get(url)
+            csvs_d.update(data_listing.urls(data_listing.files_of(self.station_id)))
 
+        annotate(metric=metric, files=len(meta_d) + len(descs_d) + len(csvs_d))
         return meta_d, descs_d, csvs_d
     
     def download_metric(self, metric) -> tuple:
@@ -56,106 +95,261 @@ class Loader:
         save_path = os.path.join(self.data_folder, metric)
         os.makedirs(os.path.join(save_path, "meta"), exist_ok=True)
 
-        # save dataset description pdfs
-        desc_file_paths = []
-        for descr, resp in descs.items():
-            desc_file_path = os.path.join(save_path, "meta", descr)
-            with open(desc_file_path, "wb") as file:
-                file.write(resp.content)
-            desc_file_paths.append(desc_file_path)
+        # fetch all files of the metric concurrently, streaming them to disk
+        jobs = {}
+        for descr, url in descs.items():
+            jobs[url] = os.path.join(save_path, "meta", descr)
+        for meta_data, url in meta.items():
+            jobs[url] = os.path.join(save_path, "meta", meta_data)
+        for csv, url in csvs.items():
+            jobs[url] = os.path.join(save_path, csv)
+        self.downloader.fetch_all(jobs)
+
+        # dataset description pdfs are kept as they are
+        desc_file_paths = [jobs[url] for url in descs.values()]
 
-        # save meta description
+        # extract meta description
         meta_file_paths = []
-        for meta_data, resp in meta.items():
-            zip_path = os.path.join(save_path, "meta", meta_data)
+        for url in meta.values():
+            meta_file_paths += self._extract(jobs[url], os.path.join(save_path, "meta"))
 
-            with open(zip_path, "wb") as z:
-                z.write(resp.content)
+        # extract dataset csvs
+        csv_file_paths = []
+        for url in csvs.values():
+            csv_file_paths += self._extract(jobs[url], save_path)
 
-            with zipfile.ZipFile(zip_path, "r") as zip_file:
-                for filename in zip_file.namelist():
-                    meta_file_paths.append(os.path.abspath(os.path.join(save_path, "meta", filename)))
-                zip_file.extractall(os.path.join(save_path, "meta"))
-            
-            os.remove(zip_path)
+        return desc_file_paths, meta_file_paths, csv_file_paths
 
-        # save dataset csvs
-        csv_file_paths = []
-        for csv, csv_resp in csvs.items():
-            zip_path = os.path.join(save_path, csv)
 
-            # write zip to disk
-            with open(zip_path, "wb") as z:
-                z.write(csv_resp.content)
+    @traced("loader.extract")
+    def _extract(self, zip_path, save_path) -> list:
+        """
+        Extracts an archive next to it, deletes it and returns the absolute paths of its contents.
+        """
+        with zipfile.ZipFile(zip_path, "r") as zip_file:
+            file_paths = [os.path.abspath(os.path.join(save_path, filename)) for filename in zip_file.namelist()]
+            zip_file.extractall(save_path)
+            annotate(path=os.path.basename(zip_path), files=len(file_paths), bytes=sum(info.file_size for info in zip_file.infolist()))
+        os.remove(zip_path)
+        return file_paths
+
+    def _read_stamps(self, files) -> pd.Series:
+        """
+        Reads only the `MESS_DATUM` column of the given csv files (or archives).
+        """
+        return pd.concat([read_product(file, usecols=["MESS_DATUM"])["MESS_DATUM"] for file in files])
+
+    @traced("loader.sync")
+    def sync(self, metrics: list = None) -> SyncReport:
+        """
+        Brings the local data of `metrics` (default: all) up to date with the
+        DWD server. The remote size, modification time and ETag of every
+        archive are compared against the manifest and only new or changed
+        archives are downloaded and extracted, replacing the files of their
+        previous version. Returns a `SyncReport` listing the changes and the
+        number of rows newer than the previously stored data.
+        """
+        report = SyncReport()
+        os.makedirs(self.data_folder, exist_ok=True)
 
-            # extract zip contents
-            with zipfile.ZipFile(zip_path, "r") as zip_file:
-                for filename in zip_file.namelist():
-                    csv_file_paths.append(os.path.abspath(os.path.join(save_path, filename)))
-                zip_file.extractall(save_path)
+        for metric in metrics or self.metrics:
+            meta, descs, csvs = self.query_metric(metric)
+            save_path = os.path.join(self.data_folder, metric)
 
-            os.remove(zip_path)
+            # descriptions are only fetched if missing
+            jobs = { url: os.path.join(save_path, "meta", name) for name, url in descs.items() }
+            self.downloader.fetch_all({ url: path for url, path in jobs.items() if not os.path.isfile(path) })
 
-        return desc_file_paths, meta_file_paths, csv_file_paths
+            entries = self.manifest.entries_for(self.station_id, metric, self.periods)
+            last_before = max([pd.Timestamp(e["last"]) for e in entries if e["last"] is not None], default=None)
 
+            archives = { url: os.path.join(save_path, "meta", name) for name, url in meta.items() }
+            archives.update({ url: os.path.join(save_path, name) for name, url in csvs.items() })
+            remote = self.downloader.head_all(list(archives.keys()))
+            jobs = {}
+            for url, path in archives.items():
+                if self.manifest.is_current(url, **remote[url]):
+                    report.unchanged.append(os.path.basename(path))
+                else:
+                    jobs[url] = path
+            downloads = self.downloader.fetch_all(jobs)
+
+            new_stamps = []
+            for url, download in downloads.items():
+                name = os.path.basename(download.path)
+                checksum = file_checksum(download.path)
+                old = self.manifest.entries.get(url)
+                entry = {
+                    "station_id": str(self.station_id).zfill(5),
+                    "metric": metric,
+                    "period": url.rstrip("/").split("/")[-2],
+                    "name": name,
+                    "size": remote[url]["size"],
+                    "mtime": remote[url]["mtime"],
+                    "etag": remote[url]["etag"],
+                    "sha256": checksum,
+                }
+
+                # the archive was touched on the server but its contents are the same
+                if old is not None and old["sha256"] == checksum:
+                    old.update(entry)
+                    # a kept archive is the file the entry points to
+                    if os.path.abspath(download.path) not in old["files"]:
+                        os.remove(download.path)
+                    report.unchanged.append(name)
+                    continue
+
+                if self.keep_archives and url in csvs.values():
+                    files = [os.path.abspath(download.path)]
+                else:
+                    files = self._extract(download.path, os.path.dirname(download.path))
+                if old is not None:
+                    for file in set(old["files"]) - set(files):
+                        if os.path.isfile(file):
+                            os.remove(file)
+                    report.changed.append(name)
+                else:
+                    report.added.append(name)
+
+                entry["files"] = files
+                if entry["period"] in Manifest.PERIOD_ORDER:
+                    stamps = self._read_stamps(files)
+                    entry["rows"] = len(stamps)
+                    entry["first"] = stamps.min().isoformat() if len(stamps) > 0 else None
+                    entry["last"] = stamps.max().isoformat() if len(stamps) > 0 else None
+                    # rows newer than anything stored before this sync
+                    new_stamps.append(stamps[stamps > last_before] if last_before is not None else stamps)
+                else:
+                    entry["rows"], entry["first"], entry["last"] = 0, None, None
+                self.manifest.entries[url] = entry
+
+            # archives of this station which are no longer served (e.g. a superseded "recent" file)
+            for url, entry in self.manifest.station_entries(self.station_id).items():
+                listed = entry["period"] in self.periods or entry["period"] == "meta_data"
+                if entry["metric"] == metric and listed and url not in archives:
+                    for file in entry["files"]:
+                        if os.path.isfile(file):
+                            os.remove(file)
+                    del self.manifest.entries[url]
+                    report.removed.append(entry["name"])
+
+            # the periods overlap, count every timestamp once like `as_dataframe`
+            report.new_rows[metric] = pd.concat(new_stamps).nunique() if len(new_stamps) > 0 else 0
+
+        self.manifest.save()
+        if os.path.isfile(self.legacy_contents_path):
+            os.remove(self.legacy_contents_path)
+
+        # make sure the next access of `as_dataframe` picks up the new rows
+        if report.has_changes:
+            self.__dict__.pop("as_dataframe", None)
+            self.__dict__.pop("time_index", None)
+            self.__dict__.pop("compact", None)
+        self.metric_files = self.manifest.metric_files(self.station_id, self.metrics, self.periods)
+        return report
 
     def download_all_metrics(self, reset=False): 
         """
     	Downloads all metrics specified in `self.metrics`. Returns a dictionary
     	mapping from metric to a list of csv file paths for later loading.
+        Once the data is downloaded, the files are taken from the manifest
+        without contacting the server; use `sync` to pick up new data and
+        `reset=True` to download everything again.
         """
-        metric_files = {}
+        if reset:
+            for url in self.manifest.station_entries(self.station_id):
+                del self.manifest.entries[url]
 
-        # download data only the first time
-        if reset or not os.path.isfile(self.contents_path):
-            os.makedirs(self.data_folder, exist_ok=True)
+        missing = [metric for metric in self.metrics if len(self.manifest.entries_for(self.station_id, metric, self.periods)) == 0]
+        if len(missing) > 0:
+            self.sync(missing)
 
-            for metric in self.metrics:
-                m_desc_path, _, m_csv_path = self.download_metric(metric)
-                metric_files[metric] =  m_csv_path
+        self.metric_files = self.manifest.metric_files(self.station_id, self.metrics, self.periods)
+        return self.metric_files
 
-            with open(os.path.join(self.contents_path), "wb") as fh:
-                pickle.dump(metric_files, fh, protocol=pickle.HIGHEST_PROTOCOL)
-        # only load the dictionary containing abs. file paths for the csv files for each metric
-        else:
-            with open(self.contents_path, "rb") as fh:
-                metric_files = pickle.load(fh)
+    def _parse_files(self, files) -> pd.DataFrame:
+        """
+        Parses the given csv files (or zip archives of them) into one frame with compact column types.
+        """
+        return pd.concat([read_product(file) for file in files])
+
+    @traced("loader.load_metric")
+    def _load_metric(self, metric, cache_keys: set) -> pd.DataFrame:
+        """
+        Returns the parsed (unsorted) rows of a metric. The frame of every
+        archive in the manifest is taken from the cache if its checksum did not
+        change, otherwise it is parsed again and stored in the cache.
+        """
+        entries = self.manifest.entries_for(self.station_id, metric, self.periods)
+        if self.cache is None or not self.cache.enabled or len(entries) == 0:
+            df = self._parse_files(self.metric_files[metric])
+            annotate(metric=metric, rows=len(df))
+            return df
 
-        self.metric_files = metric_files
-        return metric_files
+        dfs, cached = [], 0
+        for entry in entries:
+            key = self.cache.key("archive", entry["sha256"], entry["files"])
+            df = self.cache.get(key)
+            if df is None:
+                df = self._parse_files(entry["files"])
+                self.cache.put(key, df, [entry["sha256"]])
+            else:
+                cached += 1
+            cache_keys.add(key)
+            dfs.append(df)
+        df = pd.concat(dfs)
+        annotate(metric=metric, rows=len(df), archives=len(entries), cached=cached)
+        return df
 
     @functools.cached_property
+    @traced("loader.as_dataframe")
     def as_dataframe(self):
         """
         Save all metrics to disk and returns a pandas dataframe containing all
         joint metrics and a list of all seperate metrics. Note that this all
         this basic pre-processing, like properly parsing the date and
         classifying -999 values as NaN (as per the data description).
+        Parsed frames are kept in a Parquet cache keyed on the manifest, so
+        later processes only parse archives which changed since.
         """
-        if len(list(self.metric_files.items())) == 0:
+        if len(getattr(self, "metric_files", {})) == 0:
             self.download_all_metrics()
 
+        cache_keys = set()
         metric_dfs = { kind: None for kind in self.metrics }
-        for metric, files in self.metric_files.items():
-            dfs = []
-            for file in files:
-                df = pd.read_csv(file, sep=";", na_values=-999)
-                df["MESS_DATUM"] = pd.to_datetime(df["MESS_DATUM"], format="%Y%m%d%H%M")
-                dfs.append(df)
-            df = pd.concat(dfs)
-            df.sort_values(by="MESS_DATUM", inplace=True)
-            df.columns = map(lambda c: c if c == "STATIONS_ID" or c == "MESS_DATUM" else f"{c}_{metric}", df.columns)
-            metric_dfs[metric] = df
-
-        # create a single dataframe with all metric merged
-        dfs = list(metric_dfs.values())
-        if len(self.metrics) > 1:
-            df = pd.merge(dfs[0], dfs[1], on=["MESS_DATUM", "STATIONS_ID"], how="inner", suffixes=tuple(list(map(lambda x: "_" + x, metric_dfs.keys()))[:2]))
-            if len(self.metrics) > 2:
-            # Loop through the remaining DataFrames and merge with the result
-                for i, df1 in enumerate(dfs[2:]):
-                    df = pd.merge(df, df1, on=["MESS_DATUM", "STATIONS_ID"], how="inner", suffixes=(None, "_" + list(metric_dfs.keys())[i+2]))
-            return metric_dfs, df
+        for metric in self.metric_files.keys():
+            metric_dfs[metric] = metric_frame(self._load_metric(metric, cache_keys), metric, len(self.periods) > 1)
+
+        if len(self.metrics) == 1:
+            df = list(metric_dfs.values())[0]
         else:
-            return metric_dfs, list(metric_dfs.values())[0]
-            
+            # the merged frame is cached as well, it is only valid for the exact same archives
+            merged_key = self.cache.key("merged", self.metrics, self.periods, self.join, sorted(cache_keys)) if len(cache_keys) > 0 else None
+            df = self.cache.get(merged_key) if merged_key else None
+            if df is None:
+                df = align_metrics(metric_dfs, how=self.join)
+                if merged_key:
+                    sources = [e["sha256"] for metric in self.metrics for e in self.manifest.entries_for(self.station_id, metric, self.periods)]
+                    self.cache.put(merged_key, df, sources)
+
+        # entries of archives that were replaced or removed are stale, the
+        # manifest is read again as another loader may have synced meanwhile
+        if len(cache_keys) > 0:
+            self.cache.prune({ entry["sha256"] for entry in Manifest(self.manifest.path).entries.values() })
+        annotate(metrics=len(self.metrics), rows=len(df))
+        return metric_dfs, df
+
+    @functools.cached_property
+    def time_index(self) -> TimeIndex:
+        """
+        The time index of the joint dataframe for bucketed statistics and
+        period lookups, see `TimeIndex`.
+        """
+        return TimeIndex(self.as_dataframe[1]["MESS_DATUM"])
+
+    @functools.cached_property
+    def compact(self) -> CompactFrame:
+        """
+        The joint dataframe in its compact typed representation, see `CompactFrame`.
+        """
+        return CompactFrame.from_dataframe(self.as_dataframe[1])
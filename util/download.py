@@ -0,0 +1,179 @@
+import os
+import json
+import concurrent.futures
+from dataclasses import dataclass
+import requests as rq
+from requests.adapters import HTTPAdapter
+from instrument import span
+
+
+@dataclass
+class Download:
+    """
+    Result of fetching a single url. `status` is one of "downloaded",
+    "resumed" or "unchanged" (the local copy was still valid).
+    """
+    url: str
+    path: str
+    status: str
+    size: int
+    etag: str = None
+    last_modified: str = None
+
+
+class Downloader:
+    """
+    Downloads files over a pooled HTTP session with a bounded thread pool.
+    Bodies are streamed to disk in chunks and interrupted downloads are
+    resumed from the partial file using HTTP Range requests guarded by the
+    ETag/Last-Modified validators of the original response.
+    """
+    CHUNK_SIZE = 1 << 16
+    PART_SUFFIX = ".part"
+
+    def __init__(self, max_workers: int = 8, chunk_size: int = CHUNK_SIZE, timeout: float = 60, session: rq.Session = None):
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.session = session if session is not None else self.make_session(max_workers)
+
+    def make_session(self, pool_size: int) -> rq.Session:
+        """
+        Creates a session whose connection pool is large enough to serve all workers.
+        """
+        session = rq.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=3)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def get_text(self, url: str) -> str:
+        with span("download.get_text", url=url) as s:
+            resp = self.session.get(url, timeout=self.timeout)
+            resp.raise_for_status()
+            s.set(bytes=len(resp.content))
+            return resp.text
+
+    def get_conditional(self, url: str, etag: str = None, last_modified: str = None) -> tuple:
+        """
+        Fetches `url` unless it still matches the given validators. Returns
+        the body (as bytes, None if the server reports it as not modified)
+        and the ETag and Last-Modified of the current version.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        with span("download.get_conditional", url=url) as s:
+            resp = self.session.get(url, headers=headers, timeout=self.timeout)
+            if resp.status_code == 304:
+                s.set(status="unchanged")
+                return None, resp.headers.get("ETag", etag), resp.headers.get("Last-Modified", last_modified)
+            resp.raise_for_status()
+            s.set(status="downloaded", bytes=len(resp.content))
+            return resp.content, resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+
+    def head(self, url: str) -> dict:
+        """
+        Returns the remote size, modification time and ETag of `url`.
+        """
+        resp = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+        resp.raise_for_status()
+        return {
+            "size": int(resp.headers.get("Content-Length", -1)),
+            "mtime": resp.headers.get("Last-Modified"),
+            "etag": resp.headers.get("ETag"),
+        }
+
+    def head_all(self, urls: list) -> dict:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = { url: pool.submit(self.head, url) for url in urls }
+            return { url: future.result() for url, future in futures.items() }
+
+    def _read_validators(self, part_path: str) -> dict:
+        try:
+            with open(part_path + ".json", "r") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_validators(self, part_path: str, resp: rq.Response):
+        validators = { "etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified") }
+        with open(part_path + ".json", "w") as fh:
+            json.dump(validators, fh)
+
+    def fetch(self, url: str, path: str, etag: str = None, last_modified: str = None) -> Download:
+        """
+        Streams `url` to `path`. If `path` already exists and `etag` or
+        `last_modified` is given, a conditional request is made and the file
+        is left untouched when the server reports it as not modified. A
+        leftover `<path>.part` from an earlier attempt is resumed with a Range
+        request if the server still serves the same version of the file.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        part_path = path + self.PART_SUFFIX
+        headers = {}
+
+        if os.path.isfile(path) and (etag or last_modified):
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+        validators = self._read_validators(part_path) if offset > 0 else {}
+        validator = validators.get("etag") or validators.get("last_modified")
+        # without a validator we cannot know if the partial file belongs to the current version
+        if offset > 0 and validator:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+        else:
+            offset = 0
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as resp:
+            if resp.status_code == 304:
+                return Download(url, path, "unchanged", os.path.getsize(path), etag, last_modified)
+            if resp.status_code == 416:
+                # the partial file is unusable, start over
+                os.remove(part_path)
+                return self.fetch(url, path, etag, last_modified)
+            resp.raise_for_status()
+
+            if resp.status_code == 206:
+                status, mode = "resumed", "ab"
+            else:
+                # the server ignored the range (or the file changed), write from the start
+                status, mode, offset = "downloaded", "wb", 0
+                self._write_validators(part_path, resp)
+
+            with open(part_path, mode) as fh:
+                for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                    fh.write(chunk)
+
+            if status == "resumed":
+                validators = self._read_validators(part_path)
+                new_etag, new_last_modified = validators.get("etag"), validators.get("last_modified")
+            else:
+                new_etag, new_last_modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+
+        os.replace(part_path, path)
+        os.remove(part_path + ".json")
+        return Download(url, path, status, os.path.getsize(path), new_etag, new_last_modified)
+
+    def fetch_all(self, jobs: dict) -> dict:
+        """
+        Fetches a dictionary mapping from url to target path (or to a tuple of
+        target path and a dict of keyword arguments for `fetch`) concurrently.
+        Returns a dictionary mapping from url to `Download`.
+        """
+        def run(url, job):
+            path, kwargs = job if isinstance(job, tuple) else (job, {})
+            with span("download.fetch", url=url) as s:
+                download = self.fetch(url, path, **kwargs)
+                s.set(status=download.status, bytes=download.size)
+            return download
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = { url: pool.submit(run, url, job) for url, job in jobs.items() }
+            return { url: future.result() for url, future in futures.items() }
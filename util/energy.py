@@ -0,0 +1,119 @@
+import numpy as np
+import scipy.special
+
+HOURS_PER_YEAR = 8766  # 365.25 days
+AIR_DENSITY = 1.225  # kg/m^3, dry air at 15 °C
+REFERENCE_HEIGHT = 10  # m, height of the DWD FF_10 measurements
+# exponent of the wind profile power law for open, flat terrain
+HELLMANN_EXPONENT = 1 / 7
+
+
+def power_density(lambd, beta, rho: float = AIR_DENSITY):
+    """
+    Expected wind power density 0.5 * rho * E[v^3] in W/m^2 of Weibull
+    distributions, i.e. 0.5 * rho * `Weibull.n_raw_moment(3)` for arrays of parameters.
+    """
+    lambd, beta = np.asarray(lambd, dtype=float), np.asarray(beta, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        density = 0.5 * rho * lambd ** 3 * scipy.special.gamma(1 + 3 / beta)
+    # the estimators mark groups without a fit with -999
+    return np.where((lambd > 0) & (beta > 0), density, np.nan)
+
+
+def hub_height_factor(hub_height: float, reference_height: float = REFERENCE_HEIGHT, alpha: float = HELLMANN_EXPONENT, roughness: float = None) -> float:
+    """
+    Factor from wind speeds at `reference_height` to `hub_height` with the
+    power law (v_h / v_r = (h / r) ** alpha) or, if a roughness length (in m)
+    is given, with the logarithmic wind profile.
+    """
+    if roughness is not None:
+        return np.log(hub_height / roughness) / np.log(reference_height / roughness)
+    return (hub_height / reference_height) ** alpha
+
+
+def extrapolate(lambd, hub_height: float, reference_height: float = REFERENCE_HEIGHT, alpha: float = HELLMANN_EXPONENT, roughness: float = None):
+    """
+    Scale parameters at hub height: scaling all wind speeds by a constant
+    scales lambda by it and leaves beta unchanged, so this also applies to
+    raw speeds (e.g. the FF_10 column).
+    """
+    return np.asarray(lambd, dtype=float) * hub_height_factor(hub_height, reference_height, alpha, roughness)
+
+
+def _partial_moments(lambd: np.ndarray, beta: np.ndarray, v: np.ndarray) -> tuple:
+    """
+    The CDF F(v) and the partial first moment int_0^v x p(x) dx of Weibull
+    distributions at the speeds v (shape P + (N,)), with the regularized
+    lower incomplete gamma function.
+    """
+    lambd, beta = lambd[..., None], beta[..., None]
+    z = (v / lambd) ** beta
+    F = 1 - np.exp(-z)
+    M1 = lambd * scipy.special.gamma(1 + 1 / beta) * scipy.special.gammainc(1 + 1 / beta, z)
+    return F, M1
+
+
+class PowerCurve:
+    """
+    Tabulated power curve of a wind turbine: electrical power (e.g. in kW) at
+    the given hub-height wind speeds (m/s), linearly interpolated in between
+    and zero below the first (cut-in) and above the last (cut-out) speed.
+    """
+
+    def __init__(self, speeds, power, rated_power: float = None, name: str = None):
+        self.speeds = np.asarray(speeds, dtype=float)
+        self.power = np.asarray(power, dtype=float)
+        if self.speeds.ndim != 1 or self.speeds.shape != self.power.shape or len(self.speeds) < 2:
+            raise ValueError("a power curve needs at least two speeds and the power at each of them")
+        if np.any(np.diff(self.speeds) <= 0):
+            raise ValueError("the speeds of a power curve have to be increasing")
+        self.rated_power = rated_power if rated_power is not None else self.power.max()
+        self.name = name
+
+    def __repr__(self):
+        return "PowerCurve(%s, %s-%s m/s, rated %s)" % (self.name, self.speeds[0], self.speeds[-1], self.rated_power)
+
+    def __call__(self, v) -> np.ndarray:
+        v = np.asarray(v, dtype=float)
+        inside = (v >= self.speeds[0]) & (v <= self.speeds[-1])
+        return np.where(inside, np.interp(v, self.speeds, self.power), 0.0)
+
+    def expected_power(self, lambd, beta) -> np.ndarray:
+        """
+        Mean power output E[P(v)] for Weibull distributed speeds, for arrays of
+        parameters at once. On every linear segment [a, b] of the curve
+        E = (P(a) - s a) (F(b) - F(a)) + s (M(b) - M(a)) with the slope s, the
+        CDF F and the partial first moment M, which is an incomplete gamma
+        function, so there is no numerical integration. Parameter pairs
+        without a fit (-999) give NaN.
+        """
+        lambd, beta = np.broadcast_arrays(np.asarray(lambd, dtype=float), np.asarray(beta, dtype=float))
+        valid = (lambd > 0) & (beta > 0)
+        F, M1 = _partial_moments(np.where(valid, lambd, 1.0), np.where(valid, beta, 1.0), self.speeds)
+        slope = np.diff(self.power) / np.diff(self.speeds)
+        intercept = self.power[:-1] - slope * self.speeds[:-1]
+        expected = (intercept * np.diff(F, axis=-1) + slope * np.diff(M1, axis=-1)).sum(axis=-1)
+        return np.where(valid, expected, np.nan)
+
+    def capacity_factor(self, lambd, beta) -> np.ndarray:
+        return self.expected_power(lambd, beta) / self.rated_power
+
+
+def energy_yield(curves: list, lambd, beta, hub_height: float = None, hours: float = HOURS_PER_YEAR, **profile) -> dict:
+    """
+    Expected power, capacity factor and energy over `hours` (by default the
+    annual energy production, in the power unit times hours) of every power
+    curve for all (lambda, beta) pairs. If `hub_height` is given, the
+    parameters are taken as fitted to 10 m speeds and extrapolated first
+    (see `extrapolate`, `profile` are its arguments). Every array has the
+    shape (len(curves),) + the shape of lambda/beta.
+    """
+    if hub_height is not None:
+        lambd = extrapolate(lambd, hub_height, **profile)
+    power = np.stack([curve.expected_power(lambd, beta) for curve in curves])
+    rated = np.array([curve.rated_power for curve in curves]).reshape((len(curves),) + (1,) * (power.ndim - 1))
+    return {
+        "expected_power": power,
+        "capacity_factor": power / rated,
+        "energy": power * hours,
+    }
@@ -0,0 +1,230 @@
+import os
+import hashlib
+import concurrent.futures
+import numpy as np
+import pandas as pd
+import scipy.linalg
+import scipy.optimize
+from timeindex import TimeIndex
+from energy import power_density
+
+# hyperparameters (all in log space) of the kernel on fractional years:
+# long-term trend, yearly cycle with a slowly decaying amplitude, short-term irregularities and noise
+PARAMS = ["trend_scale", "trend_length", "yearly_scale", "yearly_length", "yearly_decay", "short_scale", "short_length", "noise"]
+DEFAULT_PARAMS = np.log([1.0, 20.0, 1.0, 1.0, 50.0, 0.3, 0.2, 0.3])
+BOUNDS = [(np.log(lo), np.log(hi)) for lo, hi in [(1e-2, 1e2), (2.0, 1e3), (1e-2, 1e2), (0.1, 10.0), (2.0, 1e3), (1e-3, 1e2), (0.02, 2.0), (1e-3, 10.0)]]
+JITTER = 1e-6
+
+
+def monthly_power_density(index: TimeIndex, values, start=None, end=None, method: str = "ml") -> pd.Series:
+    """
+    The power density of the Weibull distribution fitted to every month.
+    """
+    params = index.estimate(values, "month", start, end, method)
+    return pd.Series(power_density(params["param_lambda"], params["param_beta"]), index=params.index)
+
+
+def fractional_years(index) -> np.ndarray:
+    """
+    Time axis of the model: the middle of every month (for a monthly
+    PeriodIndex) or the timestamps as fractional years.
+    """
+    if isinstance(index, pd.PeriodIndex):
+        index = index.to_timestamp(how="start") + pd.Timedelta(days=15)
+    days = np.asarray(pd.DatetimeIndex(index).values.astype("datetime64[D]").astype(np.int64), dtype=float)
+    return 1970 + days / 365.25
+
+
+def kernel(theta: np.ndarray, A: np.ndarray, B: np.ndarray) -> np.ndarray:
+    """
+    The covariance of all pairs of times in A and B (fractional years) without the noise.
+    """
+    trend_s, trend_l, yearly_s, yearly_l, yearly_d, short_s, short_l, _ = np.exp(theta)
+    D = A[:, None] - B[None, :]
+    D2 = D ** 2
+    K = trend_s ** 2 * np.exp(-D2 / (2 * trend_l ** 2))
+    K += yearly_s ** 2 * np.exp(-2 * np.sin(np.pi * D) ** 2 / yearly_l ** 2 - D2 / (2 * yearly_d ** 2))
+    K += short_s ** 2 * np.exp(-D2 / (2 * short_l ** 2))
+    return K
+
+
+def kernel_diag(theta: np.ndarray, A: np.ndarray) -> np.ndarray:
+    trend_s, _, yearly_s, _, _, short_s, _, _ = np.exp(theta)
+    return np.full(len(A), trend_s ** 2 + yearly_s ** 2 + short_s ** 2)
+
+
+def _factorize(theta: np.ndarray, X: np.ndarray, y: np.ndarray, Z: np.ndarray) -> tuple:
+    """
+    FITC approximation with the inducing inputs Z in O(n m^2). Returns the
+    negative log marginal likelihood, the Cholesky factor of K_uu and the
+    posterior weights (w, S) such that the predictive mean is K_*u w and
+    the latent variance is k_** - K_*u (K_uu^-1 - S) K_u*.
+    """
+    m = len(Z)
+    noise = np.exp(theta[-1]) ** 2
+    K_uu = kernel(theta, Z, Z) + JITTER * np.eye(m)
+    K_uf = kernel(theta, Z, X)
+    L = scipy.linalg.cholesky(K_uu, lower=True)
+    V = scipy.linalg.solve_triangular(L, K_uf, lower=True)
+    # diagonal of K_ff - Q_ff plus the noise
+    Lambda = np.maximum(kernel_diag(theta, X) - (V ** 2).sum(axis=0), 0) + noise
+    A = V / np.sqrt(Lambda)
+    L_B = scipy.linalg.cholesky(np.eye(m) + A @ A.T, lower=True)
+    c = scipy.linalg.solve_triangular(L_B, A @ (y / np.sqrt(Lambda)), lower=True)
+
+    nll = 0.5 * ((y ** 2 / Lambda).sum() - c @ c + np.log(Lambda).sum() + 2 * np.log(np.diag(L_B)).sum() + len(y) * np.log(2 * np.pi))
+    # S = (K_uu + K_uf Lambda^-1 K_fu)^-1 = L^-T B^-1 L^-1
+    LL_B = L @ L_B
+    w = scipy.linalg.solve_triangular(LL_B.T, c, lower=False)
+    S = scipy.linalg.cho_solve((LL_B, True), np.eye(m))
+    return nll, L, w, S
+
+
+def _negative_log_likelihood(theta: np.ndarray, X: np.ndarray, y: np.ndarray, Z: np.ndarray) -> float:
+    try:
+        return _factorize(theta, X, y, Z)[0]
+    except (np.linalg.LinAlgError, ValueError):
+        return np.inf
+
+
+def _optimize(theta0: np.ndarray, X: np.ndarray, y: np.ndarray, Z: np.ndarray) -> tuple:
+    """
+    One restart of the hyperparameter optimization. Runs in a worker process.
+    """
+    result = scipy.optimize.minimize(_negative_log_likelihood, theta0, args=(X, y, Z), method="L-BFGS-B", bounds=BOUNDS)
+    return result.fun, result.x
+
+
+class SparseGP:
+    """
+    Gaussian process regression of a (monthly) series with m inducing points
+    (FITC approximation): training is O(n m^2) instead of O(n^3), a
+    prediction O(m) per time for the mean and O(m^2) for the variance, as
+    the posterior weights are cached after fitting. Hyperparameter restarts
+    run in parallel processes. A fitted model is saved to and loaded from a
+    single `.npz` file together with its cached forecast.
+    """
+
+    def __init__(self, n_inducing: int = 128):
+        self.n_inducing = n_inducing
+        self.theta = DEFAULT_PARAMS.copy()
+        self.forecast_index = None
+
+    def __repr__(self):
+        return "SparseGP(%s)" % ", ".join(f"{p}={v:.4g}" for p, v in zip(PARAMS, np.exp(self.theta)))
+
+    @property
+    def params(self) -> dict:
+        return dict(zip(PARAMS, np.exp(self.theta)))
+
+    def fit(self, X: np.ndarray, Y: np.ndarray, n_restarts: int = 4, max_workers: int = None, seed: int = 0, optimize: bool = True):
+        """
+        Fits the model to the times X (fractional years) and values Y (NaN
+        values are ignored). The hyperparameters are optimized from the
+        defaults and `n_restarts` - 1 random starting points in parallel.
+        """
+        X, Y = np.asarray(X, dtype=float), np.asarray(Y, dtype=float)
+        valid = ~np.isnan(Y)
+        X, Y = X[valid], Y[valid]
+        self.x_offset = X.min()
+        self.y_mean, self.y_std = Y.mean(), Y.std() if Y.std() > 0 else 1.0
+        self.X = X - self.x_offset
+        self.y = (Y - self.y_mean) / self.y_std
+        self.Z = np.linspace(self.X.min(), self.X.max(), min(self.n_inducing, len(self.X)))
+        self.data_hash = hashlib.blake2b(np.concatenate([X, Y]).tobytes(), digest_size=16).hexdigest()
+
+        if optimize:
+            rng = np.random.default_rng(seed)
+            lows, highs = np.array(BOUNDS).T
+            starts = [self.theta] + [rng.uniform(lows, highs) for _ in range(n_restarts - 1)]
+            if len(starts) == 1:
+                results = [_optimize(starts[0], self.X, self.y, self.Z)]
+            else:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as pool:
+                    results = list(pool.map(_optimize, starts, *[[a] * len(starts) for a in (self.X, self.y, self.Z)]))
+            self.theta = min(results, key=lambda r: r[0])[1]
+
+        self.nll, L, self.w, S = _factorize(self.theta, self.X, self.y, self.Z)
+        self.B = scipy.linalg.cho_solve((L, True), np.eye(len(self.Z))) - S
+        self.forecast_index = None
+        return self
+
+    def predict(self, x: np.ndarray, return_var: bool = False, noise: bool = False):
+        """
+        Predictive mean (and variance, optionally including the observation
+        noise) at the times x in the units of the training values.
+        """
+        x = np.asarray(x, dtype=float) - self.x_offset
+        K_xu = kernel(self.theta, x, self.Z)
+        mean = K_xu @ self.w * self.y_std + self.y_mean
+        if not return_var:
+            return mean
+        var = kernel_diag(self.theta, x) - np.einsum("ij,jk,ik->i", K_xu, self.B, K_xu)
+        if noise:
+            var += np.exp(self.theta[-1]) ** 2
+        return mean, np.maximum(var, 0) * self.y_std ** 2
+
+    def forecast(self, index: pd.Index) -> pd.DataFrame:
+        """
+        Predictive mean and variance for every period of `index`, e.g. a
+        monthly PeriodIndex reaching past the data. The last forecast is cached
+        (and saved with the model).
+        """
+        if self.forecast_index is None or not self.forecast_index.equals(index):
+            mean, var = self.predict(fractional_years(index), return_var=True)
+            self.forecast_index, self.forecast_mean, self.forecast_var = index, mean, var
+        return pd.DataFrame({ "mean": self.forecast_mean, "var": self.forecast_var }, index=index)
+
+    def save(self, path: str):
+        content = {
+            "n_inducing": self.n_inducing, "theta": self.theta, "x_offset": self.x_offset,
+            "y_mean": self.y_mean, "y_std": self.y_std, "X": self.X, "y": self.y, "Z": self.Z,
+            "nll": self.nll, "w": self.w, "B": self.B, "data_hash": self.data_hash,
+        }
+        if self.forecast_index is not None:
+            content.update({
+                "forecast_index": self.forecast_index.astype(str).to_numpy().astype("U"), "forecast_freq": str(getattr(self.forecast_index, "freqstr", "")),
+                "forecast_mean": self.forecast_mean, "forecast_var": self.forecast_var,
+            })
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, **content)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: str):
+        with np.load(path, allow_pickle=False) as content:
+            model = SparseGP(int(content["n_inducing"]))
+            for name in ["theta", "X", "y", "Z", "w", "B"]:
+                setattr(model, name, content[name])
+            for name in ["x_offset", "y_mean", "y_std", "nll"]:
+                setattr(model, name, float(content[name]))
+            model.data_hash = str(content["data_hash"])
+            if "forecast_index" in content:
+                labels, freq = content["forecast_index"], str(content["forecast_freq"])
+                model.forecast_index = pd.PeriodIndex(labels, freq=freq) if freq else pd.DatetimeIndex(labels)
+                model.forecast_mean, model.forecast_var = content["forecast_mean"], content["forecast_var"]
+        return model
+
+
+def forecast_power_density(series: pd.Series, horizon: int = 24, path: str = None, n_inducing: int = 128, n_restarts: int = 4, max_workers: int = None, seed: int = 0) -> tuple:
+    """
+    Fits a SparseGP to a monthly power density series (see
+    `monthly_power_density`) and forecasts `horizon` months past its end.
+    With `path` the fitted model is stored and reused as long as the series
+    did not change. Returns the model and the forecast (mean and variance per month).
+    """
+    index = pd.PeriodIndex(series.index, freq="M")
+    X, Y = fractional_years(index), series.to_numpy(dtype=float)
+    valid = ~np.isnan(Y)
+    data_hash = hashlib.blake2b(np.concatenate([X[valid], Y[valid]]).tobytes(), digest_size=16).hexdigest()
+    forecast_index = pd.period_range(index[0], index[-1] + horizon, freq="M")
+
+    model = SparseGP.load(path) if path is not None and os.path.isfile(path) else None
+    if model is None or model.data_hash != data_hash or model.n_inducing != n_inducing:
+        model = SparseGP(n_inducing).fit(X, Y, n_restarts, max_workers, seed)
+    cached = model.forecast_index is not None and model.forecast_index.equals(forecast_index)
+    forecast = model.forecast(forecast_index)
+    if path is not None and not cached:
+        model.save(path)
+    return model, forecast
@@ -0,0 +1,145 @@
+'''
+Homogeneity tests for (many) time series: the standard normal homogeneity
+test (SNHT) and the Pettitt test. Both are computed with prefix sums in
+O(n) (plus O(n log n) for the ranks of the Pettitt test) and accept a
+matrix with one series per row, e.g. one per station or per month.
+'''
+
+import os
+import concurrent.futures
+from dataclasses import dataclass
+import numpy as np
+from instrument import traced, annotate
+
+
+@dataclass
+class HomogeneityResult:
+    """
+    statistic: the test statistic T_k for every split k = 1, ..., n-1 (shape (..., n-1))
+    change_point: the most likely split, i.e. the number of values before the change
+    max_statistic: the test statistic at the change point
+    p_value: probability of a statistic at least as large under homogeneity
+    """
+    statistic: np.ndarray
+    change_point: np.ndarray
+    max_statistic: np.ndarray
+    p_value: np.ndarray
+
+
+def _as_series(X: np.ndarray) -> np.ndarray:
+    X = np.asarray(X, dtype=float)
+    if X.shape[-1] < 2:
+        raise ValueError("the series need at least two values")
+    if np.isnan(X).any():
+        raise ValueError("the series must not contain NaN values")
+    return X
+
+
+def snht_statistic(X: np.ndarray) -> np.ndarray:
+    """
+    T_k = k * z1_k ** 2 + (n - k) * z2_k ** 2 for k = 1, ..., n-1, where z1_k
+    and z2_k are the means of the standardized values before and after the split.
+    """
+    n = X.shape[-1]
+    std = X.std(axis=-1, keepdims=True)
+    Z = (X - X.mean(axis=-1, keepdims=True)) / np.where(std > 0, std, 1)
+    prefix = np.cumsum(Z, axis=-1)[..., :-1]
+    total = prefix[..., -1:] + Z[..., -1:]
+    k = np.arange(1, n)
+    return prefix ** 2 / k + (total - prefix) ** 2 / (n - k)
+
+
+def pettitt_statistic(X: np.ndarray) -> np.ndarray:
+    """
+    |U_k| with U_k = 2 * sum of the first k ranks - k * (n + 1) for k = 1, ..., n-1.
+    """
+    import scipy.stats
+    n = X.shape[-1]
+    ranks = scipy.stats.rankdata(X, axis=-1)
+    k = np.arange(1, n)
+    return np.abs(2 * np.cumsum(ranks, axis=-1)[..., :-1] - k * (n + 1))
+
+
+STATISTICS = {
+    "snht": snht_statistic,
+    "pettitt": pettitt_statistic,
+}
+
+
+def _permutation_counts(test: str, X: np.ndarray, observed: np.ndarray, n_permutations: int, seed) -> np.ndarray:
+    """
+    Counts for every series how many random permutations reach at least the observed maximum.
+    Runs in a worker process.
+    """
+    rng = np.random.default_rng(seed)
+    statistic = STATISTICS[test]
+    counts = np.zeros(observed.shape, dtype=np.int64)
+    # permute in batches to bound the memory
+    batch = max(1, min(n_permutations, 2**22 // X.size))
+    done = 0
+    while done < n_permutations:
+        size = min(batch, n_permutations - done)
+        permuted = rng.permuted(np.broadcast_to(X, (size,) + X.shape), axis=-1)
+        counts += (statistic(permuted).max(axis=-1) >= observed).sum(axis=0)
+        done += size
+    return counts
+
+
+@traced("homogeneity.permutation_p_value")
+def permutation_p_value(test: str, X: np.ndarray, observed: np.ndarray, n_permutations: int = 1000, seed: int = 0, max_workers: int = None) -> np.ndarray:
+    """
+    Monte Carlo p-value of the maximum statistic of `test` ("snht" or
+    "pettitt") under the hypothesis of exchangeable (homogeneous) values.
+    The permutations are split across `max_workers` processes (default: all
+    cores) with independent, reproducible random streams derived from `seed`.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    workers = max(1, min(max_workers, n_permutations))
+    chunks = [n_permutations // workers + (i < n_permutations % workers) for i in range(workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    annotate(test=test, permutations=n_permutations, workers=workers)
+
+    if workers == 1:
+        counts = _permutation_counts(test, X, observed, n_permutations, seeds[0])
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_permutation_counts, test, X, observed, chunk, s) for chunk, s in zip(chunks, seeds)]
+            counts = sum(future.result() for future in futures)
+    # the observed series counts as one of the permutations
+    return (counts + 1) / (n_permutations + 1)
+
+
+def _result(test: str, X: np.ndarray, p_value) -> HomogeneityResult:
+    T = STATISTICS[test](X)
+    k = T.argmax(axis=-1)
+    return HomogeneityResult(T, k + 1, T.max(axis=-1), p_value)
+
+
+@traced("homogeneity.snht")
+def snht(X: np.ndarray, n_permutations: int = 1000, seed: int = 0, max_workers: int = None) -> HomogeneityResult:
+    """
+    Standard normal homogeneity test of every series (last axis) of X. The
+    p-value is estimated from `n_permutations` random permutations.
+    """
+    X = _as_series(X)
+    annotate(series=int(np.prod(X.shape[:-1])), n=X.shape[-1])
+    observed = snht_statistic(X).max(axis=-1)
+    return _result("snht", X, permutation_p_value("snht", X, observed, n_permutations, seed, max_workers))
+
+
+@traced("homogeneity.pettitt")
+def pettitt(X: np.ndarray, n_permutations: int = 0, seed: int = 0, max_workers: int = None) -> HomogeneityResult:
+    """
+    Pettitt test of every series (last axis) of X. By default the p-value is
+    the usual approximation 2 * exp(-6 K^2 / (n^3 + n^2)), with
+    `n_permutations` > 0 it is estimated from random permutations instead.
+    """
+    X = _as_series(X)
+    n = X.shape[-1]
+    annotate(series=int(np.prod(X.shape[:-1])), n=n)
+    observed = pettitt_statistic(X).max(axis=-1)
+    if n_permutations > 0:
+        p_value = permutation_p_value("pettitt", X, observed, n_permutations, seed, max_workers)
+    else:
+        p_value = np.minimum(1, 2 * np.exp(-6 * observed ** 2 / (n ** 3 + n ** 2)))
+    return _result("pettitt", X, p_value)
@@ -0,0 +1,229 @@
+'''
+Opt-in timing spans for the data pipeline. Nothing is recorded until
+`enable` is called (or the environment variable WIND_TRACE names an output
+file), so a disabled span costs one global lookup. Every span records its
+duration and attributes such as bytes, row counts and solver iterations,
+and the spans can be exported as JSON lines or as a Chrome trace (open it
+in chrome://tracing or https://ui.perfetto.dev). Spans of worker processes
+are not collected.
+
+    recorder = instrument.enable()
+    loader.as_dataframe
+    instrument.disable().export("trace.json")
+'''
+
+import os
+import json
+import time
+import atexit
+import functools
+import threading
+
+_recorder = None
+_local = threading.local()
+
+
+class Span:
+    """
+    A timed section with attributes, used as a context manager.
+    """
+    __slots__ = ["name", "attrs", "start", "duration", "thread"]
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.start = None
+        self.duration = None
+        self.thread = threading.get_ident()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def add(self, **counts):
+        """
+        Increments counters of the span, e.g. `add(bytes=len(chunk))`.
+        """
+        for key, value in counts.items():
+            self.attrs[key] = self.attrs.get(key, 0) + value
+        return self
+
+    def __enter__(self):
+        _stack().append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter_ns() - self.start
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        recorder = _recorder
+        if recorder is not None:
+            recorder.spans.append(self)
+        return False
+
+
+class _NullSpan:
+    """
+    The span handed out while recording is disabled.
+    """
+
+    def set(self, **attrs):
+        return self
+
+    def add(self, **counts):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def _stack() -> list:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class Recorder:
+    """
+    The finished spans of all threads of this process.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.spans = []
+
+    def __len__(self):
+        return len(self.spans)
+
+    def records(self) -> list:
+        """
+        One dictionary per span: name, start and duration in seconds (relative to `enable`), thread and attributes.
+        """
+        return [
+            dict(name=s.name, start=(s.start - self.origin) / 1e9, duration=s.duration / 1e9, thread=s.thread, **s.attrs)
+            for s in sorted(self.spans, key=lambda s: s.start)
+        ]
+
+    def summary(self):
+        """
+        Number of calls and total, mean and maximum duration (s) per span name
+        as a pandas DataFrame, longest total first.
+        """
+        import pandas as pd
+        df = pd.DataFrame([{ "name": s.name, "duration": s.duration / 1e9 } for s in self.spans], columns=["name", "duration"])
+        summary = df.groupby("name")["duration"].agg(["count", "sum", "mean", "max"])
+        return summary.sort_values("sum", ascending=False)
+
+    def export_log(self, path: str):
+        """
+        Writes the spans as JSON lines, one record per line.
+        """
+        with open(path, "w") as fh:
+            for record in self.records():
+                fh.write(json.dumps(record, default=str) + "\n")
+
+    def export_chrome(self, path: str):
+        """
+        Writes the spans as complete ("X") events of the Chrome trace event format.
+        """
+        events = [{
+            "name": s.name,
+            "cat": s.name.split(".")[0],
+            "ph": "X",
+            "ts": (s.start - self.origin) / 1e3,
+            "dur": s.duration / 1e3,
+            "pid": self.pid,
+            "tid": s.thread,
+            "args": s.attrs,
+        } for s in self.spans]
+        with open(path, "w") as fh:
+            json.dump({ "traceEvents": events, "displayTimeUnit": "ms" }, fh, default=str)
+
+    def export(self, path: str):
+        """
+        JSON lines for `.jsonl` files, a Chrome trace otherwise.
+        """
+        if path.endswith(".jsonl"):
+            self.export_log(path)
+        else:
+            self.export_chrome(path)
+
+
+def enable() -> Recorder:
+    """
+    Starts recording into a new `Recorder` and returns it.
+    """
+    global _recorder
+    _recorder = Recorder()
+    return _recorder
+
+
+def disable() -> Recorder:
+    """
+    Stops recording and returns the recorder (None if recording was not enabled).
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    return recorder
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+def span(name: str, **attrs):
+    """
+    A span to use as `with span("parse.read_product", path=path) as s: ...; s.set(rows=n)`.
+    """
+    if _recorder is None:
+        return NULL_SPAN
+    return Span(name, attrs)
+
+
+def annotate(**attrs):
+    """
+    Sets attributes of the innermost open span of the current thread, e.g. of a function decorated with `traced`.
+    """
+    if _recorder is None:
+        return
+    stack = _stack()
+    if stack:
+        stack[-1].attrs.update(attrs)
+
+
+def traced(name: str):
+    """
+    Decorator which runs every call of the function in a span named `name`.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return fn(*args, **kwargs)
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _export_at_exit(path: str):
+    recorder = disable()
+    if recorder is not None:
+        recorder.export(path)
+
+
+if os.environ.get("WIND_TRACE"):
+    enable()
+    atexit.register(_export_at_exit, os.environ["WIND_TRACE"])
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+from instrument import traced, annotate
+
+KEYS = ["STATIONS_ID", "MESS_DATUM"]
+
+
+def _timestamps(df: pd.DataFrame, on: str) -> np.ndarray:
+    ts = df[on].to_numpy()
+    if len(ts) > 1 and not np.all(ts[1:] > ts[:-1]):
+        raise ValueError(f"`{on}` has to be sorted and unique for every metric")
+    return ts
+
+
+def _grid(stamps: list, how: str) -> np.ndarray:
+    """
+    Builds the shared time axis of all metrics.
+    """
+    # on sorted unique indexes pandas uses a linear merge instead of sorting
+    if how == "inner":
+        grid = pd.Index(stamps[0])
+        for ts in stamps[1:]:
+            grid = grid.intersection(pd.Index(ts))
+        return grid.to_numpy()
+    if how == "outer":
+        grid = pd.Index(stamps[0])
+        for ts in stamps[1:]:
+            grid = grid.union(pd.Index(ts))
+        return grid.to_numpy()
+    if how == "asof":
+        return stamps[0]
+    raise ValueError(f"unknown join `{how}`, use one of inner, outer or asof")
+
+
+def _indexer(ts: np.ndarray, grid: np.ndarray, how: str, tolerance) -> np.ndarray:
+    """
+    Returns for every grid point the row of `ts` to take, -1 marks a missing value.
+    Both arrays are sorted, so this is a single binary search per grid point.
+    """
+    if len(ts) == 0:
+        return np.full(len(grid), -1)
+    if how == "asof":
+        # the last row at or before the grid point
+        pos = np.searchsorted(ts, grid, side="right") - 1
+        valid = pos >= 0
+        if tolerance is not None:
+            valid &= (grid - ts[np.maximum(pos, 0)]) <= pd.Timedelta(tolerance).to_timedelta64()
+        return np.where(valid, pos, -1)
+
+    pos = np.searchsorted(ts, grid)
+    clipped = np.minimum(pos, len(ts) - 1)
+    return np.where((pos < len(ts)) & (ts[clipped] == grid), clipped, -1)
+
+
+@traced("join.align_metrics")
+def align_metrics(metric_dfs: dict, how: str = "inner", on: str = "MESS_DATUM", tolerance=None) -> pd.DataFrame:
+    """
+    Joins the frames of several metrics (of one station) on their sorted
+    time axis. Instead of chaining hash merges, every metric is aligned onto
+    a shared grid with a binary search and each output column is allocated
+    exactly once.
+
+    how:
+    - "inner": only timestamps present in all metrics (like the chained `pd.merge`)
+    - "outer": all timestamps of any metric, missing values are NaN
+    - "asof": the timestamps of the first metric, other metrics contribute
+      their last value at or before each timestamp (optionally at most
+      `tolerance`, e.g. pd.Timedelta("10min"), before)
+
+    The key columns are taken from the grid, all other columns keep their names.
+    """
+    dfs = list(metric_dfs.values())
+    station_ids = pd.unique(np.concatenate([df["STATIONS_ID"].to_numpy() for df in dfs]))
+    if len(station_ids) > 1:
+        raise ValueError("align_metrics expects the data of a single station, got stations %s" % list(station_ids))
+
+    stamps = [_timestamps(df, on) for df in dfs]
+    grid = _grid(stamps, how)
+
+    columns = { "STATIONS_ID": np.full(len(grid), station_ids[0] if len(station_ids) > 0 else 0, dtype=dfs[0]["STATIONS_ID"].dtype), on: grid }
+    for df, ts in zip(dfs, stamps):
+        indexer = _indexer(ts, grid, how, tolerance)
+        has_missing = bool((indexer < 0).any())
+        for column in df.columns:
+            if column in KEYS or column == on:
+                continue
+            values = df[column].array
+            columns[column] = pd.api.extensions.take(values, indexer, allow_fill=has_missing)
+
+    # keep the column order of the chained merge: the first frame, then the others
+    order = list(dfs[0].columns) + [c for df in dfs[1:] for c in df.columns if c not in KEYS and c != on]
+    annotate(how=how, metrics=len(dfs), rows=len(grid))
+    return pd.DataFrame({ c: columns[c] for c in order }, copy=False)
@@ -0,0 +1,157 @@
+'''
+Cached listings of the DWD directory indexes. An index page is scanned for
+its links with a single regular expression pass instead of building a
+BeautifulSoup tree, the parsed listing is kept in memory and on disk, and
+it is only revalidated with a conditional GET (ETag/Last-Modified) once it
+is older than the TTL. Every listing has an index from station id to its
+files, so one fetch of a directory serves all stations.
+'''
+
+import os
+import re
+import json
+import time
+import html
+import hashlib
+from dataclasses import dataclass, field
+from instrument import span
+
+# the station id in DWD file names such as `10minutenwerte_wind_02115_20000101_20091231_hist.zip`
+# or `Meta_Daten_zehn_min_ff_02115.zip`
+STATION_PATTERN = re.compile(r"_(\d{5})(?=[_.])")
+HREF_PATTERN = re.compile(rb"""<a\s[^>]*?href\s*=\s*["']([^"']*)["']""", re.IGNORECASE)
+
+
+def station_of(filename: str) -> str:
+    """
+    Extracts the station id from a DWD file name, None if it has none.
+    """
+    match = STATION_PATTERN.search(filename)
+    return match.group(1) if match else None
+
+
+def parse_links(content) -> list:
+    """
+    The href targets of all links of an index page (str or bytes), in page
+    order and without the parent directory and query links.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    links = []
+    for match in HREF_PATTERN.finditer(content):
+        href = html.unescape(match.group(1).decode("utf-8", errors="replace"))
+        if href and not href.startswith(("?", "/", "..")):
+            links.append(href)
+    return links
+
+
+@dataclass
+class Listing:
+    """
+    The file names of one directory index and the validators of the response it was parsed from.
+    """
+    url: str
+    names: list
+    fetched: float
+    etag: str = None
+    last_modified: str = None
+    stations: dict = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if self.stations is None:
+            self.stations = {}
+            for name in self.names:
+                station = station_of(name)
+                if station is not None:
+                    self.stations.setdefault(station, []).append(name)
+
+    def files_of(self, station_id: str) -> list:
+        return self.stations.get(str(station_id).zfill(5), [])
+
+    def urls(self, names: list) -> dict:
+        """
+        Maps file names to their urls.
+        """
+        return { name: self.url + name for name in names }
+
+    def to_json(self) -> dict:
+        return { "url": self.url, "names": self.names, "fetched": self.fetched, "etag": self.etag, "last_modified": self.last_modified }
+
+
+class ListingCache:
+    """
+    Directory listings by url, kept in memory and as JSON files in `folder`
+    (None keeps them in memory only). A listing younger than `ttl` seconds is
+    used as it is, an older one is revalidated with a conditional GET and
+    only downloaded and parsed again if the server reports a change.
+    """
+    VERSION = 1
+
+    def __init__(self, downloader, folder: str = None, ttl: float = 3600):
+        self.downloader = downloader
+        self.folder = folder
+        self.ttl = ttl
+        self.memory = {}
+
+    def path(self, url: str) -> str:
+        return os.path.join(self.folder, hashlib.sha256(url.encode()).hexdigest()[:32] + ".json")
+
+    def _read(self, url: str) -> Listing:
+        if self.folder is None or not os.path.isfile(self.path(url)):
+            return None
+        try:
+            with open(self.path(url), "r") as fh:
+                content = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if content.get("version") != self.VERSION or content["listing"]["url"] != url:
+            return None
+        return Listing(**content["listing"])
+
+    def _write(self, listing: Listing):
+        if self.folder is None:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        tmp_path = self.path(listing.url) + ".tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump({ "version": self.VERSION, "listing": listing.to_json() }, fh)
+        os.replace(tmp_path, self.path(listing.url))
+
+    def get(self, url: str, max_age: float = None) -> Listing:
+        """
+        The listing of `url`, at most `max_age` (default: the TTL) seconds old.
+        """
+        max_age = self.ttl if max_age is None else max_age
+        with span("listing.get", url=url) as s:
+            listing = self.memory.get(url) or self._read(url)
+            if listing is not None and time.time() - listing.fetched <= max_age:
+                s.set(status="cached", entries=len(listing.names))
+                self.memory[url] = listing
+                return listing
+
+            etag, last_modified = (listing.etag, listing.last_modified) if listing is not None else (None, None)
+            content, etag, last_modified = self.downloader.get_conditional(url, etag, last_modified)
+            if content is None:
+                # not modified, the stored listing is valid for another TTL
+                listing.fetched = time.time()
+                s.set(status="revalidated", entries=len(listing.names))
+            else:
+                listing = Listing(url, parse_links(content), time.time(), etag, last_modified)
+                s.set(status="fetched", entries=len(listing.names), bytes=len(content))
+            self.memory[url] = listing
+            self._write(listing)
+            return listing
+
+    def invalidate(self, url: str = None):
+        """
+        Forgets the listing of `url` (default: all listings), so the next `get` fetches it again.
+        """
+        urls = [url] if url is not None else list(self.memory)
+        for u in urls:
+            self.memory.pop(u, None)
+            if self.folder is not None and os.path.isfile(self.path(u)):
+                os.remove(self.path(u))
+        if url is None and self.folder is not None and os.path.isdir(self.folder):
+            for name in os.listdir(self.folder):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.folder, name))
@@ -0,0 +1,112 @@
+import os
+import json
+import hashlib
+from dataclasses import dataclass, field
+from listing import station_of
+
+
+def file_checksum(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Returns the sha256 hex digest of the file at `path`.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class SyncReport:
+    """
+    Summary of a `Loader.sync` run. The lists contain the names of the remote
+    archives, `new_rows` maps from metric to the number of rows (distinct
+    timestamps, as in `Loader.as_dataframe`) that were added to the stored dataset.
+    """
+    added: list = field(default_factory=list)
+    changed: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+    unchanged: list = field(default_factory=list)
+    new_rows: dict = field(default_factory=dict)
+
+    @property
+    def has_changes(self) -> bool:
+        return len(self.added) + len(self.changed) + len(self.removed) > 0
+
+    def __repr__(self):
+        return "SyncReport(added=%s, changed=%s, removed=%s, unchanged=%s, new_rows=%s)" % (
+            len(self.added), len(self.changed), len(self.removed), len(self.unchanged), self.new_rows)
+
+
+class Manifest:
+    """
+    Versioned record of all remote archives that make up the local dataset.
+    Every entry is keyed by the archive url and stores the station id, the
+    metric, the DWD directory it was found in ("historical", "recent", "now" or "meta_data"),
+    the remote size, modification time and ETag, the checksum of the
+    downloaded archive, the extracted files and their row count and range.
+    Loaders of different stations can share one manifest, every lookup is
+    restricted to the entries of one station.
+    """
+    VERSION = 1
+    PERIOD_ORDER = ["historical", "recent", "now"]
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        if os.path.isfile(path):
+            with open(path, "r") as fh:
+                content = json.load(fh)
+            if content.get("version") != self.VERSION:
+                raise ValueError(f"unsupported manifest version {content.get('version')} in {path}")
+            self.entries = content["entries"]
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump({ "version": self.VERSION, "entries": self.entries }, fh, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def is_current(self, url: str, size: int, mtime: str, etag: str = None) -> bool:
+        """
+        Checks whether the remote archive at `url` still matches the recorded one.
+        """
+        entry = self.entries.get(url)
+        if entry is None:
+            return False
+        if etag and entry.get("etag"):
+            return etag == entry["etag"]
+        return size == entry.get("size") and mtime == entry.get("mtime")
+
+    @staticmethod
+    def station_of(entry: dict) -> str:
+        """
+        The station of an entry, taken from the archive name for entries written before it was stored.
+        """
+        return entry.get("station_id") or station_of(entry["name"])
+
+    def station_entries(self, station_id: str) -> dict:
+        """
+        All entries (data and meta data) of a station, keyed by url.
+        """
+        station_id = str(station_id).zfill(5)
+        return { url: e for url, e in self.entries.items() if self.station_of(e) == station_id }
+
+    def entries_for(self, station_id: str, metric: str, periods: list = PERIOD_ORDER) -> list:
+        """
+        Returns all data entries of a station and metric from the given periods
+        ordered by period (historical first) and name. Entries of meta data
+        archives are left out.
+        """
+        entries = [e for e in self.station_entries(station_id).values() if e["metric"] == metric and e["period"] in periods]
+        return sorted(entries, key=lambda e: (self.PERIOD_ORDER.index(e["period"]), e["name"]))
+
+    def files_for(self, station_id: str, metric: str, periods: list = PERIOD_ORDER) -> list:
+        return [f for entry in self.entries_for(station_id, metric, periods) for f in entry["files"]]
+
+    def metric_files(self, station_id: str, metrics: list, periods: list = PERIOD_ORDER) -> dict:
+        return { metric: self.files_for(station_id, metric, periods) for metric in metrics }
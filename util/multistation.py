@@ -0,0 +1,173 @@
+import os
+import shutil
+import warnings
+import concurrent.futures
+import pandas as pd
+from parse import read_product, metric_frame
+from join import align_metrics
+from dataloader import Loader, DWDClient
+from listing import station_of
+from manifest import Manifest, file_checksum
+
+
+def build_station(station_id: str, metric_archives: dict, dataset_folder: str, dedupe: bool, join: str) -> int:
+    """
+    Parses all archives of one station, joins the metrics and writes one
+    Parquet partition per year to `dataset_folder/station=<id>/year=<year>`.
+    Returns the number of rows written. Runs in a worker process.
+    """
+    metric_dfs = {
+        metric: metric_frame(pd.concat([read_product(archive) for archive in archives]), metric, dedupe)
+        for metric, archives in metric_archives.items()
+    }
+    df = align_metrics(metric_dfs, how=join) if len(metric_dfs) > 1 else list(metric_dfs.values())[0]
+
+    station_folder = os.path.join(dataset_folder, f"station={station_id}")
+    shutil.rmtree(station_folder, ignore_errors=True)
+    for year, year_df in df.groupby(df["MESS_DATUM"].dt.year, sort=False):
+        year_folder = os.path.join(station_folder, f"year={year}")
+        os.makedirs(year_folder, exist_ok=True)
+        year_df.to_parquet(os.path.join(year_folder, "part.parquet"), index=False)
+    return len(df)
+
+
+class MultiLoader(DWDClient):
+    """
+    Loads the data of many stations at once. Every DWD directory is listed
+    only once per metric and period for all stations, the archives are
+    downloaded concurrently (only new or changed ones) and kept compressed, and the stations are parsed
+    in parallel worker processes. The result is stored as a Parquet dataset
+    partitioned by station and year, so `read` only touches the partitions
+    it needs.
+    """
+
+    def __init__(self, metrics: list, data_folder: str, station_ids: list, base_url: str = None, max_workers: int = 8, max_processes: int = None, periods: list = ["historical"], join: str = "inner", listing_ttl: float = 3600):
+        """
+        metrics is a list of "wind", "air_temperature", "precipitation" and/or "solar"
+        station_ids is a list of DWD station ids such as "02115"
+        max_workers is the number of concurrent downloads, max_processes the number of parsing processes
+        listing_ttl is the number of seconds a directory listing is used before it is revalidated
+        """
+        self.metrics = metrics
+        self.data_folder = data_folder
+        self.station_ids = [str(s).zfill(5) for s in station_ids]
+        self.base_url = base_url.rstrip("/") if base_url else Loader.DATA_BASE_URL
+        self.periods = periods
+        self.join = join
+        self.max_processes = max_processes
+        self.max_workers = max_workers
+        self.listing_ttl = listing_ttl
+        self.archive_folder = os.path.join(data_folder, "archives")
+        self.dataset_folder = os.path.join(data_folder, "dataset")
+        self.manifest = Manifest(os.path.join(self.archive_folder, "manifest.json"))
+
+    def query(self) -> dict:
+        """
+        Lists every metric/period directory once (see `ListingCache`) and
+        returns a dictionary mapping from station id to a dictionary mapping
+        from metric to the archive urls of that station.
+        """
+        station_urls = { station: { metric: [] for metric in self.metrics } for station in self.station_ids }
+        for metric in self.metrics:
+            for period in self.periods:
+                listing = self.listings.get(f"{self.base_url}/{metric}/{period}/")
+                for station in self.station_ids:
+                    station_urls[station][metric] += [listing.url + name for name in listing.files_of(station) if name.endswith(".zip")]
+        return station_urls
+
+    def download(self, reset: bool = False) -> tuple:
+        """
+        Downloads the archives of all stations. Like `Loader.sync`, the
+        remote size, modification time and ETag of every archive are compared
+        against the manifest and only new or changed archives are fetched
+        (all of them if `reset`); archives which are no longer served are
+        deleted. Returns the same structure as `query` with local paths and
+        the set of stations whose archives changed.
+        """
+        station_urls = self.query()
+        archives, stations, station_archives = {}, {}, {}
+        for station, metric_urls in station_urls.items():
+            station_archives[station] = {}
+            for metric, urls in metric_urls.items():
+                paths = [os.path.join(self.archive_folder, metric, url.split("/")[-1]) for url in urls]
+                station_archives[station][metric] = paths
+                for url, path in zip(urls, paths):
+                    archives[url], stations[url] = (metric, path), station
+
+        remote = self.downloader.head_all(list(archives.keys()))
+        jobs = {
+            url: path for url, (metric, path) in archives.items()
+            if reset or not os.path.isfile(path) or not self.manifest.is_current(url, **remote[url])
+        }
+        updated = set()
+        for url, download in self.downloader.fetch_all(jobs).items():
+            checksum = file_checksum(download.path)
+            old = self.manifest.entries.get(url)
+            # an archive that was only touched on the server does not change the station
+            if old is None or old["sha256"] != checksum:
+                updated.add(stations[url])
+            self.manifest.entries[url] = {
+                "station_id": stations[url],
+                "metric": archives[url][0],
+                "period": url.rstrip("/").split("/")[-2],
+                "name": os.path.basename(download.path),
+                "size": remote[url]["size"],
+                "mtime": remote[url]["mtime"],
+                "etag": remote[url]["etag"],
+                "sha256": checksum,
+                "files": [os.path.abspath(download.path)],
+            }
+
+        # archives of the loaded stations, metrics and periods which are no longer served
+        for station in self.station_ids:
+            for url, entry in self.manifest.station_entries(station).items():
+                if entry["metric"] in self.metrics and entry["period"] in self.periods and url not in archives:
+                    for file in entry["files"]:
+                        if os.path.isfile(file):
+                            os.remove(file)
+                    del self.manifest.entries[url]
+                    updated.add(station)
+        self.manifest.save()
+        return station_archives, updated
+
+    def partitions(self, station_id: str) -> list:
+        folder = os.path.join(self.dataset_folder, f"station={station_id}")
+        return sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+
+    def load(self, reset: bool = False) -> dict:
+        """
+        Downloads and parses all stations. Stations whose archives did not
+        change and which are already partitioned are skipped, stations
+        without data for one of the metrics are left out with a warning.
+        Returns a dictionary mapping from station id to the number of rows written.
+        """
+        station_archives, updated = self.download(reset)
+        tasks = {}
+        for station, metric_archives in station_archives.items():
+            if any(len(archives) == 0 for archives in metric_archives.values()):
+                warnings.warn(f"Skipping station {station}: no data for {[m for m, a in metric_archives.items() if len(a) == 0]}")
+                continue
+            if reset or station in updated or len(self.partitions(station)) == 0:
+                tasks[station] = metric_archives
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_processes) as pool:
+            futures = {
+                station: pool.submit(build_station, station, metric_archives, self.dataset_folder, len(self.periods) > 1, self.join)
+                for station, metric_archives in tasks.items()
+            }
+            return { station: future.result() for station, future in futures.items() }
+
+    def read(self, station_ids: list = None, years: list = None, columns: list = None) -> pd.DataFrame:
+        """
+        Reads the stored data of the given stations and years (default: all),
+        only opening the matching partitions.
+        """
+        files = []
+        for station in [str(s).zfill(5) for s in station_ids] if station_ids else self.station_ids:
+            for partition in self.partitions(station):
+                year = int(partition.removeprefix("year="))
+                if years is None or year in years:
+                    files.append(os.path.join(self.dataset_folder, f"station={station}", partition, "part.parquet"))
+        if len(files) == 0:
+            return pd.DataFrame(columns=columns)
+        return pd.concat([pd.read_parquet(file, columns=columns) for file in files], ignore_index=True)
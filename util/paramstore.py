@@ -0,0 +1,149 @@
+import os
+import json
+import hashlib
+import collections
+import numpy as np
+import pandas as pd
+from weibull import Weibull
+from timeindex import TimeIndex
+
+METRICS = ["mse", "cdf_mse", "r2", "cdf_r2", "kl", "rel"]
+
+
+def slice_hash(values: np.ndarray) -> str:
+    """
+    Fingerprint of the values of one period.
+    """
+    return hashlib.blake2b(np.ascontiguousarray(values, dtype=np.float64).tobytes(), digest_size=16).hexdigest()
+
+
+class ParamStore:
+    """
+    Persistent store of fitted Weibull parameters and fit metrics per period.
+    Every entry is keyed by station, bucket frequency ("year", "month" or
+    "day"), period, estimator method and the hash of the values of that
+    period, so a period is only refitted when its data changed (e.g. the
+    trailing month after new rows arrived). Recently used entries are kept in
+    an in-memory LRU of at most `max_entries`, all entries are stored as one
+    JSON file per station in `folder` (None keeps them in memory only).
+    """
+    VERSION = 1
+
+    def __init__(self, folder: str = None, max_entries: int = 10_000):
+        self.folder = folder
+        self.max_entries = max_entries
+        self.memory = collections.OrderedDict()
+
+    def path(self, station: str) -> str:
+        return os.path.join(self.folder, f"{station}.json")
+
+    def _read(self, station: str) -> dict:
+        if self.folder is None or not os.path.isfile(self.path(station)):
+            return {}
+        with open(self.path(station), "r") as fh:
+            content = json.load(fh)
+        # entries of an other version are simply refitted
+        return content["entries"] if content.get("version") == self.VERSION else {}
+
+    def _write(self, station: str, entries: dict):
+        if self.folder is None:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        tmp_path = self.path(station) + ".tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump({ "version": self.VERSION, "entries": entries }, fh, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path(station))
+
+    def _remember(self, key: tuple, entry: dict):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _fit(self, values: np.ndarray, offsets: np.ndarray, method: str) -> list:
+        """
+        Fits all given periods in one batch and computes their fit metrics.
+        """
+        lambd, beta = Weibull.estimate_batch(values, offsets, method)
+        entries = []
+        for i, (a, b) in enumerate(zip(offsets[:-1], offsets[1:])):
+            X = values[a:b]
+            X = X[~np.isnan(X)]
+            entry = { "lambda": float(lambd[i]), "beta": float(beta[i]), "n": len(X) }
+            if len(X) > 0 and lambd[i] > 0 and beta[i] > 0:
+                metrics = Weibull.gof(lambd[i], beta[i], *Weibull.fit_histogram(X))
+                entry.update({ metric: float(metrics[metric]) for metric in METRICS })
+            else:
+                entry.update({ metric: np.nan for metric in METRICS })
+            entries.append(entry)
+        return entries
+
+    def params(self, station: str, index: TimeIndex, values, freq: str = "month", method: str = "ml", start=None, end=None) -> pd.DataFrame:
+        """
+        Returns the parameters (param_lambda, param_beta), the number of values
+        and the fit metrics (see `Weibull.gof`) of all periods from `start` to
+        `end` (see `TimeIndex.buckets`) of the values of one station. Only
+        periods without a stored entry for their current data are fitted.
+        """
+        codes, offsets = index.buckets(freq, start, end)
+        values = np.asarray(index.take(values)[offsets[0]:offsets[-1]], dtype=float)
+        offsets = offsets - offsets[0]
+
+        stored = None
+        entries, missing = [None] * len(codes), []
+        for i, code in enumerate(codes):
+            digest = slice_hash(values[offsets[i]:offsets[i + 1]])
+            key = (station, freq, int(code), method, digest)
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                entries[i] = self.memory[key]
+                continue
+            if stored is None:
+                stored = self._read(station)
+            entry = stored.get(f"{freq}/{method}/{code}")
+            if entry is not None and entry["hash"] == digest:
+                entries[i] = entry
+                self._remember(key, entry)
+            else:
+                missing.append((i, key))
+
+        if len(missing) > 0:
+            # fit all missing periods in one batch over the concatenated slices
+            slices = [values[offsets[i]:offsets[i + 1]] for i, _ in missing]
+            sizes = np.array([len(s) for s in slices])
+            fitted = self._fit(np.concatenate(slices), np.concatenate([[0], np.cumsum(sizes)]), method)
+            for (i, key), entry in zip(missing, fitted):
+                entry["hash"] = key[-1]
+                entries[i] = entry
+                stored[f"{freq}/{method}/{key[2]}"] = entry
+                self._remember(key, entry)
+            self._write(station, stored)
+
+        df = pd.DataFrame(entries, index=index.labels(freq, codes), columns=["lambda", "beta", "n"] + METRICS)
+        return df.rename(columns={ "lambda": "param_lambda", "beta": "param_beta" })
+
+    def invalidate(self, station: str, since=None, freq: str = None, method: str = None) -> int:
+        """
+        Removes the entries of a station (optionally only of one frequency or
+        method) for all periods that end after `since`, e.g. the last stored
+        timestamp before new rows were appended. Returns the number of removed
+        stored entries. Without `since` all entries of the station are removed.
+        """
+        # the period that contains `since` may have changed as well
+        since_index = TimeIndex([pd.Timestamp(since).to_datetime64()]) if since is not None else None
+
+        def affected(entry_freq: str, entry_method: str, code: int) -> bool:
+            if (freq is not None and entry_freq != freq) or (method is not None and entry_method != method):
+                return False
+            return since_index is None or code >= since_index.codes(entry_freq)[0]
+
+        for key in [key for key in self.memory if key[0] == station and affected(key[1], key[3], key[2])]:
+            del self.memory[key]
+
+        stored = self._read(station)
+        removed = [name for name in stored if affected(*name.split("/")[:2], int(name.split("/")[2]))]
+        for name in removed:
+            del stored[name]
+        if len(removed) > 0:
+            self._write(station, stored)
+        return len(removed)
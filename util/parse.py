@@ -0,0 +1,133 @@
+import io
+import os
+import zipfile
+import fnmatch
+import numpy as np
+import pandas as pd
+from instrument import span, traced, annotate
+
+# explicit types of the DWD 10-minute product files, all other columns are measurements
+DTYPES = {
+    "STATIONS_ID": "int32",
+    "MESS_DATUM": "int64",
+    "eor": "category",
+}
+MEASUREMENT_DTYPE = "float32"
+NA_VALUES = [-999]
+PRODUCT_PATTERN = "produkt_*.txt"
+# rows per chunk of the streaming reader, about two years of 10-minute values
+CHUNK_ROWS = 100_000
+
+
+def parse_timestamps(stamps: np.ndarray) -> np.ndarray:
+    """
+    Converts integer timestamps in the fixed format YYYYMMDDhhmm to
+    datetime64 with plain integer arithmetic instead of string parsing.
+    """
+    stamps = np.asarray(stamps, dtype=np.int64)
+    date, time = np.divmod(stamps, 10_000)
+    year, month_day = np.divmod(date, 10_000)
+    month, day = np.divmod(month_day, 100)
+    hour, minute = np.divmod(time, 100)
+
+    months = (year - 1970) * 12 + month - 1
+    days = months.astype("datetime64[M]").astype("datetime64[D]") + (day - 1).astype("timedelta64[D]")
+    minutes = days.astype("datetime64[m]") + (hour * 60 + minute).astype("timedelta64[m]")
+    return minutes.astype("datetime64[ns]")
+
+
+def _dtypes(columns: list) -> dict:
+    return { c: DTYPES.get(c.strip(), MEASUREMENT_DTYPE) for c in columns }
+
+
+def _read_header(fh) -> list:
+    return fh.readline().decode("latin-1").rstrip("\r\n").split(";")
+
+
+def _csv_options(header: list, usecols: list) -> dict:
+    return dict(
+        sep=";", names=header, header=None, usecols=usecols,
+        dtype=_dtypes(header), na_values=NA_VALUES, encoding="latin-1",
+    )
+
+
+def _parse_stamps(df: pd.DataFrame) -> pd.DataFrame:
+    if "MESS_DATUM" in df.columns:
+        with span("parse.timestamps", rows=len(df)):
+            df["MESS_DATUM"] = parse_timestamps(df["MESS_DATUM"].to_numpy())
+    return df
+
+
+def read_product_file(fh, usecols: list = None) -> pd.DataFrame:
+    """
+    Parses a single product file from a (binary) file handle with the
+    explicit dtype map and the fixed-format timestamp parser.
+    """
+    header = _read_header(fh)
+    return _parse_stamps(pd.read_csv(fh, **_csv_options(header, usecols)))
+
+
+def iter_product_file(fh, usecols: list = None, chunksize: int = CHUNK_ROWS):
+    """
+    Like `read_product_file`, but yields the rows in chunks of at most `chunksize` rows.
+    """
+    header = _read_header(fh)
+    with pd.read_csv(fh, chunksize=chunksize, **_csv_options(header, usecols)) as reader:
+        for df in reader:
+            yield _parse_stamps(df)
+
+
+def product_members(zip_file: zipfile.ZipFile) -> list:
+    return [name for name in zip_file.namelist() if fnmatch.fnmatch(name.split("/")[-1], PRODUCT_PATTERN)]
+
+
+@traced("parse.read_product")
+def read_product(path: str, usecols: list = None) -> pd.DataFrame:
+    """
+    Reads a DWD product from an extracted text file or directly from a zip
+    archive. Archives are never extracted to disk, the `produkt_*.txt`
+    members are decompressed while they are parsed.
+    """
+    if not zipfile.is_zipfile(path):
+        with open(path, "rb") as fh:
+            df = read_product_file(fh, usecols)
+    else:
+        with zipfile.ZipFile(path, "r") as zip_file:
+            dfs = []
+            for member in product_members(zip_file):
+                with zip_file.open(member, "r") as fh:
+                    dfs.append(read_product_file(io.BufferedReader(fh), usecols))
+        df = pd.concat(dfs) if len(dfs) > 1 else dfs[0]
+    annotate(path=os.path.basename(path), bytes=os.path.getsize(path), rows=len(df))
+    return df
+
+
+def iter_product(path: str, usecols: list = None, chunksize: int = CHUNK_ROWS):
+    """
+    Streams a DWD product (text file or zip archive, see `read_product`) in
+    chunks of at most `chunksize` rows, so only one chunk is held in memory.
+    """
+    if not zipfile.is_zipfile(path):
+        with open(path, "rb") as fh:
+            yield from iter_product_file(fh, usecols, chunksize)
+        return
+
+    with zipfile.ZipFile(path, "r") as zip_file:
+        for member in product_members(zip_file):
+            with zip_file.open(member, "r") as fh:
+                yield from iter_product_file(io.BufferedReader(fh), usecols, chunksize)
+
+
+def metric_frame(df: pd.DataFrame, metric: str, dedupe: bool) -> pd.DataFrame:
+    """
+    Prepares the parsed rows of one metric for the join: the rows are put
+    in time order, duplicated timestamps are dropped if `dedupe` and all
+    columns except the station and the timestamp get the metric as suffix
+    (e.g. FF_10_wind).
+    """
+    df = df.sort_values(by="MESS_DATUM", kind="stable")
+    # the periods overlap, prefer the quality controlled historical rows
+    if dedupe:
+        df.drop_duplicates(subset="MESS_DATUM", keep="first", inplace=True)
+    df.columns = map(lambda c: c if c == "STATIONS_ID" or c == "MESS_DATUM" else f"{c}_{metric}", df.columns)
+    return df
@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+from parse import iter_product, metric_frame, CHUNK_ROWS
+from join import align_metrics
+from timeindex import TimeIndex
+from weibull import WeibullAccumulator
+from dataloader import Loader
+
+
+class _Source:
+    """
+    The time-ordered rows of one product file, read chunk by chunk on demand.
+    """
+
+    def __init__(self, path: str, first: np.datetime64, chunksize: int):
+        self.path = path
+        self.first = first
+        self.chunksize = chunksize
+        self.chunks = None
+        self.pending = []
+        self.exhausted = False
+
+    def _fill(self):
+        # make sure there is at least one pending chunk unless the file is finished
+        if self.chunks is None:
+            self.chunks = iter_product(self.path, chunksize=self.chunksize)
+        while len(self.pending) == 0 and not self.exhausted:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.exhausted = True
+            elif len(chunk) > 0:
+                self.pending.append(chunk)
+
+    def peek(self) -> np.datetime64:
+        """
+        The next timestamp of the file (or None when it is finished) without opening it before it is needed.
+        """
+        if self.chunks is None and self.first is not None:
+            return self.first
+        self._fill()
+        return self.pending[0]["MESS_DATUM"].iloc[0].to_datetime64() if len(self.pending) > 0 else None
+
+    def take_until(self, stop: np.datetime64) -> list:
+        """
+        Removes and returns all rows before `stop` (as a list of frames).
+        """
+        if self.chunks is None and self.first is not None and self.first >= stop:
+            return []
+        taken = []
+        while True:
+            self._fill()
+            if len(self.pending) == 0:
+                return taken
+            chunk = self.pending[0]
+            stamps = chunk["MESS_DATUM"].to_numpy()
+            split = np.searchsorted(stamps, stop)
+            if split < len(chunk):
+                taken.append(chunk.iloc[:split])
+                self.pending[0] = chunk.iloc[split:]
+                return taken
+            taken.append(chunk)
+            self.pending.pop(0)
+
+
+class Pipeline:
+    """
+    Out-of-core mode of a `Loader`: instead of loading every metric for the
+    whole record, the product files are streamed in time order and the
+    joint frame is built one year at a time (parse, deduplicate and join like
+    `Loader.as_dataframe`). Statistics, fits and accumulators are computed
+    per year and combined, so the memory is bounded by about one year of
+    data plus one read chunk per open file, while the per-period results are
+    the same as on the in-memory frame.
+    """
+
+    def __init__(self, loader: Loader, chunksize: int = CHUNK_ROWS):
+        self.loader = loader
+        self.chunksize = chunksize
+
+    def _sources(self, metric: str) -> list:
+        """
+        The files of a metric in the order `Loader.as_dataframe` concatenates them (historical first).
+        """
+        entries = self.loader.manifest.entries_for(self.loader.station_id, metric, self.loader.periods)
+        if len(entries) == 0:
+            return [_Source(path, None, self.chunksize) for path in self.loader.metric_files[metric]]
+        sources = []
+        for entry in entries:
+            first = np.datetime64(entry["first"], "ns") if entry.get("first") else None
+            sources += [_Source(path, first, self.chunksize) for path in entry["files"]]
+        return sources
+
+    def chunks(self):
+        """
+        Yields (year, frame) for every year with data, the frame has the same
+        rows and columns as that year of `Loader.as_dataframe[1]`.
+        """
+        if len(getattr(self.loader, "metric_files", {})) == 0:
+            self.loader.download_all_metrics()
+        metrics, join = self.loader.metrics, self.loader.join
+        metric_sources = { metric: self._sources(metric) for metric in metrics }
+        # an empty frame of every metric, needed for years in which a metric has no rows
+        empty = {}
+        for metric, sources in metric_sources.items():
+            for source in sources:
+                if source.peek() is not None:
+                    source._fill()
+                    empty[metric] = source.pending[0].iloc[:0]
+                    break
+        # the last row of every metric, the asof join may need it at the start of the next year
+        carry = { metric: None for metric in metrics }
+
+        while True:
+            stamps = [s.peek() for sources in metric_sources.values() for s in sources]
+            stamps = [s for s in stamps if s is not None]
+            if len(stamps) == 0:
+                return
+            year = int(str(min(stamps))[:4])
+            stop = np.datetime64(f"{year + 1:04d}-01-01", "ns")
+
+            metric_dfs = {}
+            for metric, sources in metric_sources.items():
+                parts = [part for source in sources for part in source.take_until(stop)]
+                if len(parts) == 0 and metric not in empty:
+                    continue
+                df = pd.concat(parts) if len(parts) > 0 else empty[metric]
+                metric_dfs[metric] = metric_frame(df, metric, len(self.loader.periods) > 1)
+
+            if len(metrics) == 1:
+                df = metric_dfs[metrics[0]]
+            else:
+                joined = dict(metric_dfs)
+                if join == "asof":
+                    for metric in metrics[1:]:
+                        if carry[metric] is not None:
+                            joined[metric] = pd.concat([carry[metric], joined[metric]])
+                    for metric, metric_df in metric_dfs.items():
+                        if len(metric_df) > 0:
+                            carry[metric] = metric_df.iloc[-1:]
+                df = align_metrics(joined, how=join)
+            if len(df) > 0:
+                yield year, df.reset_index(drop=True)
+
+    def _reindex(self, results: list, first, last, freq: str, start, end, fill) -> pd.DataFrame:
+        """
+        Combines the per-year results (indexed by the buckets of whole years)
+        and restricts them to the buckets from `start` (default: the first
+        bucket with data) to `end` (default: the last one).
+        """
+        codes, _ = TimeIndex(np.array([first, last])).buckets(freq, start, end)
+        labels = TimeIndex(np.array([first])).labels(freq, codes)
+        combined = pd.concat(results)
+        return combined.reindex(labels, fill_value=fill)
+
+    def _per_year(self, compute, column: str, freq: str, start, end, fill):
+        results, first, last = [], None, None
+        for year, df in self.chunks():
+            stamps = df["MESS_DATUM"].to_numpy()
+            first = stamps[0] if first is None else first
+            last = stamps[-1]
+            index = TimeIndex(stamps)
+            results.append(compute(index, df[column].to_numpy(dtype=float), year))
+        if len(results) == 0:
+            raise ValueError("there is no data to process")
+        return self._reindex(results, first, last, freq, start, end, fill)
+
+    def params(self, column: str = "FF_10_wind", freq: str = "month", method: str = "ml", start=None, end=None) -> pd.DataFrame:
+        """
+        Same as `TimeIndex.estimate` on the in-memory frame: the Weibull
+        parameters (param_lambda, param_beta) of every year, month or day.
+        """
+        return self._per_year(lambda index, values, year: index.estimate(values, freq, year, year, method), column, freq, start, end, -999.0)
+
+    def aggregate(self, column: str, freq: str = "month", func: str = "mean", start=None, end=None) -> pd.Series:
+        """
+        Same as `TimeIndex.aggregate` on the in-memory frame for one of the
+        reductions, e.g. the monthly mean wind speed.
+        """
+        fill = 0.0 if func in ["count", "sum"] else np.nan
+        return self._per_year(lambda index, values, year: index.aggregate(values, freq, func, year, year), column, freq, start, end, fill)
+
+    def accumulate(self, column: str = "FF_10_wind", freq: str = None, resolution: float = 0.1) -> dict:
+        """
+        Collects the quantized values of every year or month (`freq`, or the
+        whole record for None) in a `WeibullAccumulator`. Periods that span
+        several chunks (like the whole record) are merged across chunks, the
+        ML estimate of an accumulator equals the estimate on the raw values.
+        """
+        accumulators = {}
+        for year, df in self.chunks():
+            values = df[column].to_numpy(dtype=float)
+            if freq is None:
+                accumulators.setdefault(None, WeibullAccumulator(resolution)).update(values)
+                continue
+            index = TimeIndex(df["MESS_DATUM"].to_numpy())
+            codes, offsets = index.buckets(freq, year, year)
+            values = index.take(values)
+            for label, a, b in zip(index.labels(freq, codes), offsets[:-1], offsets[1:]):
+                if b > a:
+                    accumulators.setdefault(label, WeibullAccumulator(resolution)).update(values[a:b])
+        return accumulators
+
+    def estimates(self, column: str = "FF_10_wind", freq: str = None, resolution: float = 0.1) -> dict:
+        """
+        The Weibull distributions of the accumulated periods, see `accumulate`.
+        """
+        return { label: accumulator.estimate() for label, accumulator in self.accumulate(column, freq, resolution).items() }
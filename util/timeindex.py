@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+from weibull import Weibull
+from instrument import traced, annotate
+
+# the numpy unit of every bucket frequency, the integer value of a timestamp
+# in that unit (e.g. months since 1970-01) is the bucket code
+FREQS = {
+    "year": "datetime64[Y]",
+    "month": "datetime64[M]",
+    "day": "datetime64[D]",
+}
+REDUCTIONS = ["count", "sum", "mean", "std", "min", "max"]
+
+
+class TimeIndex:
+    """
+    Precomputed time index of a series of timestamps. The rows are kept in
+    time order (an argsort is only stored if the timestamps are not already
+    sorted), so every year, month or day is a contiguous range of rows whose
+    bounds are found with a binary search. Statistics and estimators run
+    over all buckets in one pass over the sorted values.
+    """
+
+    def __init__(self, stamps):
+        stamps = np.asarray(stamps, dtype="datetime64[ns]")
+        if len(stamps) > 1 and not np.all(stamps[1:] >= stamps[:-1]):
+            self.order = np.argsort(stamps, kind="stable")
+            stamps = stamps[self.order]
+        else:
+            self.order = None
+        self.stamps = stamps
+        self._codes = {}
+
+    def __len__(self):
+        return len(self.stamps)
+
+    def codes(self, freq: str) -> np.ndarray:
+        """
+        The (non-decreasing) bucket codes of the sorted rows, e.g. years for "year".
+        """
+        if freq not in FREQS:
+            raise ValueError(f"unknown frequency `{freq}`, use one of {list(FREQS)}")
+        if freq not in self._codes:
+            codes = self.stamps.astype(FREQS[freq]).astype(np.int64)
+            self._codes[freq] = codes + 1970 if freq == "year" else codes
+        return self._codes[freq]
+
+    def take(self, values) -> np.ndarray:
+        """
+        Brings values given in the original row order into time order.
+        """
+        values = np.asarray(values)
+        return values if self.order is None else values[self.order]
+
+    def _bound(self, freq: str, value, end: bool) -> int:
+        """
+        The code of the first bucket at or after `value` (e.g. 2000 or "2000-03"),
+        or, with `end`, of the first bucket after the period `value`.
+        """
+        stamp = np.datetime64(str(value))
+        if end:
+            stamp = stamp + 1
+        code = stamp.astype(FREQS[freq]).astype(np.int64)
+        if end and stamp > code.astype(FREQS[freq]):
+            # the period ends within a bucket, e.g. a day for yearly buckets
+            code += 1
+        return code + 1970 if freq == "year" else code
+
+    def buckets(self, freq: str, start=None, end=None) -> tuple:
+        """
+        Returns the codes of all buckets from `start` to `end` (both inclusive,
+        default: the first and the last bucket of the data, empty buckets
+        included) and the row offsets: the rows of the i-th bucket are
+        offsets[i]:offsets[i+1] of the sorted rows.
+        """
+        codes = self.codes(freq)
+        if len(codes) == 0 and (start is None or end is None):
+            return np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64)
+        first = self._bound(freq, start, False) if start is not None else codes[0]
+        stop = self._bound(freq, end, True) if end is not None else codes[-1] + 1
+        labels = np.arange(first, max(first, stop))
+        return labels, np.searchsorted(codes, np.append(labels, labels[-1] + 1 if len(labels) > 0 else first))
+
+    def labels(self, freq: str, codes: np.ndarray) -> pd.Index:
+        """
+        Readable index of bucket codes: years, monthly periods or dates.
+        """
+        if freq == "year":
+            return pd.Index(codes, name="Years")
+        if freq == "month":
+            return pd.DatetimeIndex(codes.astype("datetime64[M]")).to_period("M")
+        return pd.DatetimeIndex(codes.astype("datetime64[D]"))
+
+    def period(self, year: int, month: int = -1, day: int = -1):
+        """
+        The rows of one year (or month of a year, or day of a month) in time
+        order as a slice if the timestamps are sorted, else as positions.
+        Two binary searches, no scan over the data.
+        """
+        if month == -1:
+            start = np.datetime64(f"{year:04d}", "Y")
+        elif day == -1:
+            start = np.datetime64(f"{year:04d}-{month:02d}", "M")
+        else:
+            start = np.datetime64(f"{year:04d}-{month:02d}-{day:02d}", "D")
+        lo, hi = np.searchsorted(self.stamps, np.array([start, start + 1], dtype="datetime64[ns]"))
+        return slice(lo, hi) if self.order is None else self.order[lo:hi]
+
+    @traced("timeindex.aggregate")
+    def aggregate(self, values, freq: str, func="mean", start=None, end=None) -> pd.Series:
+        """
+        Computes a statistic of the values (in the original row order) for
+        every bucket. `func` is one of REDUCTIONS, which ignore NaN values and
+        are computed with segment reductions, or any function of an array,
+        which is called once per (sorted) bucket. Empty buckets are NaN.
+        """
+        codes, offsets = self.buckets(freq, start, end)
+        annotate(freq=freq, buckets=len(codes), rows=int(offsets[-1] - offsets[0]))
+        values = self.take(values)[offsets[0]:offsets[-1]]
+        offsets = offsets - offsets[0]
+
+        if callable(func):
+            result = np.array([func(values[a:b]) if b > a else np.nan for a, b in zip(offsets[:-1], offsets[1:])], dtype=float)
+            return pd.Series(result, index=self.labels(freq, codes))
+        if func not in REDUCTIONS:
+            raise ValueError(f"unknown statistic `{func}`, use one of {REDUCTIONS} or a function")
+
+        values = values.astype(float)
+        valid = ~np.isnan(values)
+        # drop the NaN values and move the offsets accordingly
+        offsets = np.concatenate([[0], np.cumsum(valid)])[offsets]
+        values = values[valid]
+        count = np.diff(offsets)
+        filled = count > 0
+        starts = offsets[:-1][filled]
+
+        result = np.full(len(codes), np.nan)
+        if func == "count":
+            result = count.astype(float)
+        elif func in ["sum", "mean", "std"]:
+            total = np.add.reduceat(values, starts) if len(starts) > 0 else np.zeros(0)
+            if func == "sum":
+                result = np.zeros(len(codes))
+                result[filled] = total
+            elif func == "mean":
+                result[filled] = total / count[filled]
+            else:
+                # two-pass variance (ddof=1 like pandas) to avoid cancellation
+                mean = np.repeat(total / count[filled], count[filled])
+                squares = np.add.reduceat((values - mean) ** 2, starts) if len(starts) > 0 else np.zeros(0)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    result[filled] = np.sqrt(squares / (count[filled] - 1))
+        elif len(starts) > 0:
+            result[filled] = (np.minimum if func == "min" else np.maximum).reduceat(values, starts)
+        return pd.Series(result, index=self.labels(freq, codes))
+
+    @traced("timeindex.estimate")
+    def estimate(self, values, freq: str, start=None, end=None, method: str = "ml") -> pd.DataFrame:
+        """
+        Estimates the Weibull parameters of the values (in the original row
+        order) of every bucket in one batch, see `Weibull.estimate_batch`.
+        """
+        codes, offsets = self.buckets(freq, start, end)
+        annotate(freq=freq, method=method, buckets=len(codes))
+        values = np.asarray(self.take(values)[offsets[0]:offsets[-1]], dtype=float)
+        lambd, beta = Weibull.estimate_batch(values, offsets - offsets[0], method)
+        return pd.DataFrame({ "param_lambda": lambd, "param_beta": beta }, index=self.labels(freq, codes))
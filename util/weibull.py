@@ -1,9 +1,13 @@
 import numpy as np
-import scipy
-import scipy.optimize
-import scipy.special
 import functools
 import math
+from instrument import traced, annotate
+
+
+def gamma(x):
+    # scipy is imported on first use, it takes longer to import than the rest of the numeric core
+    import scipy.special
+    return scipy.special.gamma(x)
 
 class Weibull:
     # https://en.wikipedia.org/wiki/Weibull_distribution
@@ -46,7 +50,7 @@ class Weibull:
     
     def n_raw_moment(self, n=1):
         # https://proofwiki.org/wiki/Raw_Moment_of_Weibull_Distribution
-        return self.lambd ** n * scipy.special.gamma(1 + n / self.beta)
+        return self.lambd ** n * gamma(1 + n / self.beta)
         
     @functools.cached_property
     def mode(self):
@@ -54,7 +58,7 @@ class Weibull:
 
     @functools.cached_property
     def median(self):
-        return self.lambd * scipy.special.gamma(1 + 1 / self.beta)
+        return self.lambd * gamma(1 + 1 / self.beta)
     
     def ml_lambda(X: np.ndarray, beta: float) -> float:
         """
@@ -71,12 +75,23 @@ class Weibull:
         assert len(X[X > 0]) > 0, "invalid input"
         N = X.shape[0]
         l_fn = lambda beta: - 1 / N * np.sum(np.log(X)) - 1 / beta + np.sum(X ** beta * np.log(X)) / np.sum(X ** beta)
+        import scipy.optimize
         return scipy.optimize.root(l_fn, 2.0)
 
-    def estimate(X: np.ndarray):
+    @traced("weibull.estimate")
+    def estimate(X: np.ndarray, method: str = "ml"):
         """
         Estimate the parameters of the Weibull distribution using the Maximum Likelihood Method.
+        The Graphical and the Energy Pattern Factor Method can be chosen with
+        `method` "graphical" or "epf" (see `Weibull.METHODS`).
         """
+        if method == "graphical":
+            return Weibull.graphical_estimate(X)
+        if method == "epf":
+            return Weibull.epf_estimate(X)
+        if method != "ml":
+            raise ValueError(f"unknown method `{method}`, use one of {Weibull.METHODS}")
+
         # only consider positive values for the ML-estimation (log is only defined for positive numbers)
         X = X[X > 0]
         X= X[~np.isnan(X)]
@@ -84,8 +99,11 @@ class Weibull:
         #assert len(X) > 0, "invalid input"
         # exception if no data is available for computation
         
+        annotate(method=method, rows=len(X))
         try:
-            b = Weibull.ml_beta(X).x.item()
+            root = Weibull.ml_beta(X)
+            annotate(iterations=root.nfev)
+            b = root.x.item()
             l = Weibull.ml_lambda(X, b).item()
         except Exception:
             b=-999
@@ -96,46 +114,196 @@ class Weibull:
        
     
     
-    def graphical_parameters(X: np.ndarray): 
-        '''
-        Compute the parameters of the weibull distribution with the graphical method 
-        '''
-        max_included_windspeed=int(np.nanmax(X)+1)
-        number_of_bins=1000
-        edges=np.linspace(0,max_included_windspeed, number_of_bins)
-        #Start by computing the empirical CDF:
-        empiric_pdf= np.histogram(X, bins=edges)[0]
-        CDF=np.array([empiric_pdf[0]])
-        for i in range(1, len(empiric_pdf)):
-            CDF=np.append(CDF, CDF[i-1]+empiric_pdf[i] )
-        
-        # disregard the first d  bins? -> This makes sure we have no near-constant part in the beginning
-        d=0
-        for i in range(0, len(CDF)):
-            d=i
-            if CDF[i] >0.1:
-                break
+    @traced("weibull.ml_batch")
+    def ml_batch(X: np.ndarray, offsets: np.ndarray, weights: np.ndarray = None, tol: float = 1e-10, max_iter: int = 50) -> tuple:
+        """
+        Estimate the parameters of many samples at once using the Maximum Likelihood Method.
+        X is the flat array of all samples, the i-th sample is X[offsets[i]:offsets[i+1]].
+        If `weights` is given, X[j] is counted weights[j] times (e.g. distinct
+        values and their counts). The shape equation of `ml_beta` is solved for
+        all groups simultaneously with vectorized Newton iterations. Returns
+        the arrays (lambda, beta); groups without at least two distinct
+        positive values (or without convergence) get -999 like `estimate`.
+        """
+        X = np.asarray(X, dtype=float)
+        offsets = np.asarray(offsets)
+        n_groups = len(offsets) - 1
+        group = np.repeat(np.arange(n_groups), np.diff(offsets))
 
-        edges=edges[d:]
-        empiric_pdf=empiric_pdf[d:]
-        CDF=CDF[d:]
+        # only consider positive values for the ML-estimation (log is only defined for positive numbers)
+        valid = X > 0
+        if weights is not None:
+            weights = np.asarray(weights, dtype=float)
+            valid &= weights > 0
+            weights = weights[valid]
+        X, group = X[valid], group[valid]
+        # number of array elements per group (the segment layout) and number of observations
+        sizes = np.bincount(group, minlength=n_groups)
+        N = np.bincount(group, weights=weights, minlength=n_groups) if weights is not None else sizes
+
+        def group_sum(values, sizes):
+            # the groups are contiguous, so all group sums are segment sums
+            nonempty = sizes > 0
+            result = np.zeros(len(sizes))
+            result[nonempty] = np.add.reduceat(values, (np.cumsum(sizes) - sizes)[nonempty])
+            return result
+
+        has_data = sizes > 0
+        # scale every group by its maximum, so X ** beta cannot overflow; the shape equation is scale invariant
+        scale = np.zeros(n_groups)
+        scale[has_data] = np.maximum.reduceat(X, (np.cumsum(sizes) - sizes)[has_data])
+        log_Y = np.log(X / scale[group])
+        weighted_log_Y = log_Y * weights if weights is not None else log_Y
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_log = group_sum(weighted_log_Y, sizes) / N
+            # start at the moment estimate (log X is Gumbel distributed with std pi / (beta * sqrt(6)))
+            std_log = np.sqrt(np.maximum(group_sum(weighted_log_Y * log_Y, sizes) / N - mean_log ** 2, 0))
+            beta = np.pi / (np.sqrt(6) * std_log)
+        # for constant samples the likelihood has no maximum
+        active = has_data & (std_log > 1e-12)
+        converged = np.zeros(n_groups, dtype=bool)
+
+        # the working set only holds the values of groups which did not converge yet
+        work = np.flatnonzero(active)
+        keep = active[group]
+        w_log_Y = log_Y[keep]
+        w_weights = weights[keep] if weights is not None else None
+        w_local = (np.cumsum(active) - 1)[group[keep]]
+        buffer, weighted = np.empty_like(w_log_Y), np.empty_like(w_log_Y)
+        iterations = 0
+        for _ in range(max_iter):
+            still_active = active[work]
+            if not still_active.any():
+                break
+            iterations += 1
+            if still_active.sum() < len(work) / 2:
+                keep = still_active[w_local]
+                w_log_Y = w_log_Y[keep]
+                w_weights = w_weights[keep] if weights is not None else None
+                w_local = (np.cumsum(still_active) - 1)[w_local[keep]]
+                buffer, weighted = buffer[:len(w_log_Y)], weighted[:len(w_log_Y)]
+                work = work[still_active]
+                still_active = still_active[still_active]
+
+            b = beta[work]
+            w_sizes = sizes[work]
+            # Y ** beta, Y ** beta * log Y and Y ** beta * log(Y) ** 2 without temporaries
+            np.take(b, w_local, out=buffer)
+            np.multiply(buffer, w_log_Y, out=buffer)
+            np.exp(buffer, out=buffer)
+            if w_weights is not None:
+                np.multiply(buffer, w_weights, out=buffer)
+            S0 = group_sum(buffer, w_sizes)
+            np.multiply(buffer, w_log_Y, out=weighted)
+            S1 = group_sum(weighted, w_sizes)
+            np.multiply(weighted, w_log_Y, out=weighted)
+            S2 = group_sum(weighted, w_sizes)
+            m1 = S1 / S0
+            # l(beta) as in `ml_beta` and its derivative, which is always positive
+            l = - mean_log[work] - 1 / b + m1
+            dl = S2 / S0 - m1 ** 2 + 1 / b ** 2
+            new_b = b - np.where(still_active, l / dl, 0.0)
+            # stay in the domain beta > 0
+            new_b = np.where(new_b > 0, new_b, b / 2)
+            done = still_active & (np.abs(new_b - b) <= tol * b)
+            beta[work] = new_b
+            converged[work[done]] = True
+            active[work[done]] = False
+
+        converged &= np.isfinite(beta)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            Y_beta = np.exp(np.where(converged, beta, 1.0)[group] * log_Y)
+            S0 = group_sum(Y_beta * weights if weights is not None else Y_beta, sizes)
+            lambd = scale * (S0 / N) ** (1 / beta)
+        lambd = np.where(converged, lambd, -999.0)
+        beta = np.where(converged, beta, -999.0)
+        annotate(groups=n_groups, rows=len(X), iterations=iterations, converged=int(converged.sum()))
+        return lambd, beta
+
+    def ml_counts(values: np.ndarray, counts: np.ndarray):
+        """
+        Estimate the parameters of the Weibull distribution using the Maximum
+        Likelihood Method from distinct values and their counts (e.g. a
+        histogram of the 0.1 m/s quantized wind speeds). This gives the same
+        estimate as `estimate` on the raw sample at a cost proportional to the
+        number of distinct values.
+        """
+        values = np.asarray(values, dtype=float)
+        lambd, beta = Weibull.ml_batch(values, [0, len(values)], weights=counts)
+        return Weibull(lambd.item(), beta.item())
 
-        #normalize the CDF and the PDF
-        empiric_pdf=(empiric_pdf/CDF[len(CDF)-1])
-        CDF=CDF/CDF[len(CDF)-1]
+    GRAPHICAL_BINS = 1000
 
-        # transform the axes of the CDF in order to find the Weibull parameters
-        mod_CDF= np.log(-np.log(1-CDF[1:] +0.000001) +0.000001) # HOW TO RESOLVE THIS PROPERLY?
-        log_edges=np.log(edges[2:])
+    def _histogram_edges(X: np.ndarray, group: np.ndarray, n_groups: int, n_edges: int) -> tuple:
+        """
+        Counts the values of every group in `n_edges - 1` equal bins between 0
+        and the group maximum rounded up (like `np.histogram` with `np.linspace` edges).
+        Returns the counts of shape (n_groups, n_edges - 1) and the bin widths.
+        """
+        upper = np.zeros(n_groups)
+        np.maximum.at(upper, group, X)
+        width = np.floor(upper + 1) / (n_edges - 1)
+        idx = np.floor(X / width[group]).astype(np.int64)
+        # correct rounding at the bin edges, the same way `np.histogram` does
+        idx -= X < idx * width[group]
+        idx += X >= (idx + 1) * width[group]
+        idx = np.clip(idx, 0, n_edges - 2)
+        counts = np.bincount(group * (n_edges - 1) + idx, minlength=n_groups * (n_edges - 1))
+        return counts.reshape(n_groups, n_edges - 1), width
+
+    @traced("weibull.graphical_batch")
+    def graphical_batch(X: np.ndarray, offsets: np.ndarray) -> tuple:
+        """
+        Estimate the parameters of many samples (see `ml_batch` for the
+        layout) at once with the graphical method of `graphical_parameters`:
+        a linear regression of log(-log(1 - CDF)) on the log of the bin edges
+        of the empiric CDF. Returns the arrays (lambda, beta), -999 for groups
+        without enough data.
+        """
+        X = np.asarray(X, dtype=float)
+        offsets = np.asarray(offsets)
+        n_groups = len(offsets) - 1
+        group = np.repeat(np.arange(n_groups), np.diff(offsets))
+        # only consider positive values (log is only defined for positive numbers)
+        valid = X > 0
+        X, group = X[valid], group[valid]
+
+        n_edges = Weibull.GRAPHICAL_BINS
+        counts, width = Weibull._histogram_edges(X, group, n_groups, n_edges)
+        CDF = np.cumsum(counts, axis=1)
+        total = CDF[:, -1:]
+
+        # disregard the first d bins, i.e. the near-constant part in the beginning
+        nonzero = CDF > 0.1
+        d = np.where(nonzero.any(axis=1), nonzero.argmax(axis=1), n_edges - 2)
+        j = np.arange(n_edges - 1)
+        # pairs of CDF[j] and edges[j + 1] for j > d
+        mask = j[None, :] > d[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            y = np.log(-np.log(1 - CDF / total + 0.000001) + 0.000001)
+            x = np.log(j + 1)[None, :] + np.log(width)[:, None]
+            n = mask.sum(axis=1)
+            x, y = np.where(mask, x, 0.0), np.where(mask, y, 0.0)
+            mean_x, mean_y = x.sum(axis=1) / n, y.sum(axis=1) / n
+            cov = (mask * (x - mean_x[:, None]) * (y - mean_y[:, None])).sum(axis=1)
+            var = (mask * (x - mean_x[:, None]) ** 2).sum(axis=1)
+            b = cov / var
+            l = np.exp(- (mean_y - b * mean_x) / b)
+
+        ok = (n >= 2) & np.isfinite(b) & np.isfinite(l)
+        annotate(groups=n_groups, rows=len(X))
+        return np.where(ok, l, -999.0), np.where(ok, b, -999.0)
 
-         # now do linear regression
-        linpol=np.polyfit(log_edges, mod_CDF, 1)
-        mod_CDF_model = np.poly1d(linpol)
-        b=linpol[0]
-        l=np.exp( - linpol[1]/linpol[0])
-        return [l,b]
-    
-    
+    def graphical_parameters(X: np.ndarray): 
+        '''
+        Compute the parameters of the weibull distribution with the graphical method 
+        '''
+        X = np.asarray(X, dtype=float)
+        X = X[~np.isnan(X)]
+        l, b = Weibull.graphical_batch(X, [0, len(X)])
+        if l[0] == -999:
+            raise ValueError("not enough data for the graphical method")
+        return [l.item(), b.item()]
 
     def graphical_estimate(X: np.ndarray):
         """
@@ -155,39 +323,119 @@ class Weibull:
             l=params[0]
             b=params[1]
             return Weibull(l,b)
-        
+
+    @traced("weibull.epf_batch")
+    def epf_batch(X: np.ndarray, offsets: np.ndarray) -> tuple:
+        """
+        Estimate the parameters of many samples (see `ml_batch` for the
+        layout) at once with the Energy Pattern Factor Method. Returns the
+        arrays (lambda, beta), -999 for groups without positive values.
+        """
+        X = np.asarray(X, dtype=float)
+        offsets = np.asarray(offsets)
+        n_groups = len(offsets) - 1
+        group = np.repeat(np.arange(n_groups), np.diff(offsets))
+        # only consider positive values
+        valid = X > 0
+        X, group = X[valid], group[valid]
+
+        N = np.bincount(group, minlength=n_groups)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.bincount(group, weights=X, minlength=n_groups) / N
+            mean_cube = np.bincount(group, weights=X ** 3, minlength=n_groups) / N
+            epf = mean_cube / mean ** 3
+            b = 1 + 3.69 / epf ** 2
+            l = mean / gamma(1 + 1 / b)
+        ok = N > 0
+        annotate(groups=n_groups, rows=len(X))
+        return np.where(ok, l, -999.0), np.where(ok, b, -999.0)
+
     def epf_estimate(X: np.ndarray):
         """
         Estimate the parameters of the Weibull distribution using the Energy Pattern Factor Method
         """
         # only consider positive values for the ML-estimation (log is only defined for positive numbers)
-        X= X[X > 0]
-        X= X[~np.isnan(X)]
+        X = np.asarray(X, dtype=float)
+        X = X[X > 0]
+        l, b = Weibull.epf_batch(X, [0, len(X)])
+        return Weibull(l.item(), b.item())
 
-        # exception if no data is available for computation
-        try:
-            enum=0
-            for v in X:
-                enum=enum +v**3
-            
-            enum= enum/len(X)
-
-            denom=0
-            for v in X:
-                denom=denom +v
-            
-            denom=denom/len(X)
-            denom =denom**3
-            
-            epf=enum/denom
-            b=1+ 3.69/(epf**2)
-            l=X.mean()/scipy.special.gamma(1 + 1 /b)
-        except Exception: 
-            l=-999
-            b=-999
-        finally:
-            return Weibull(l,b)
-    
+    # the available estimators for `estimate` and `estimate_batch`
+    METHODS = ["ml", "graphical", "epf"]
+
+    def estimate_batch(X: np.ndarray, offsets: np.ndarray, method: str = "ml") -> tuple:
+        """
+        Estimate the parameters of many samples at once with the Maximum
+        Likelihood ("ml"), Graphical ("graphical") or Energy Pattern Factor
+        ("epf") Method. X is the flat array of all samples, the i-th sample is
+        X[offsets[i]:offsets[i+1]]. Returns the arrays (lambda, beta).
+        """
+        if method == "ml":
+            return Weibull.ml_batch(X, offsets)
+        if method == "graphical":
+            return Weibull.graphical_batch(X, offsets)
+        if method == "epf":
+            return Weibull.epf_batch(X, offsets)
+        raise ValueError(f"unknown method `{method}`, use one of {Weibull.METHODS}")
+
+    def cdf_batch(X: np.ndarray, lambd: np.ndarray, beta: np.ndarray) -> np.ndarray:
+        """
+        The cummulative probability density function for many parameter pairs
+        at once. The result has the shape of lambd/beta followed by the shape of X.
+        """
+        X = np.asarray(X, dtype=float)
+        expand = (...,) + (None,) * X.ndim
+        lambd, beta = np.asarray(lambd, dtype=float)[expand], np.asarray(beta, dtype=float)[expand]
+        with np.errstate(invalid="ignore", over="ignore"):
+            return np.where(X > 0, 1 - np.exp(- (np.maximum(X, 0) / lambd) ** beta), 0.0)
+
+    def fit_histogram(X: np.ndarray) -> tuple:
+        """
+        The normalized empiric pdf and the bin edges used by `fit`, i.e.
+        0.1 * sqrt(n) + 1 bins between 0 and the maximum rounded up.
+        """
+        n_bins = int(0.1 * np.sqrt(len(X))) + 2
+        edges = np.linspace(0, int(np.nanmax(X) + 1), n_bins)
+        empiric_pdf = np.histogram(X, bins=edges)[0]
+        return empiric_pdf / empiric_pdf.sum(), edges
+
+    @traced("weibull.gof")
+    def gof(lambd, beta, empiric_pdf: np.ndarray, edges: np.ndarray) -> dict:
+        """
+        Computes all goodness of fit metrics of Weibull distributions to
+        normalized histograms in a single pass. The CDF is evaluated once over
+        all edges. `lambd` and `beta` can be scalars or arrays of shape P,
+        `empiric_pdf` has shape H + (B,) and `edges` H + (B + 1,) (or just
+        (B + 1,) if all histograms share their bins). Every metric is returned
+        as an array of shape P + H:
+        mse, cdf_mse: MSE of the PDF and the CDF
+        r2, cdf_r2: R^2 of the PDF and the CDF
+        kl: KL-Divergence of the fit from the empiric pdf
+        rel: expected relative error per bin (see `rel_fit`)
+        """
+        empiric_pdf = np.asarray(empiric_pdf, dtype=float)
+        edges = np.broadcast_to(edges, empiric_pdf.shape[:-1] + (empiric_pdf.shape[-1] + 1,))
+        n_edges = edges.shape[-1]
+
+        F = Weibull.cdf_batch(edges, lambd, beta)
+        model_pdf = np.diff(F, axis=-1)
+        empiric_cdf = np.cumsum(empiric_pdf, axis=-1)
+
+        sq_err = ((empiric_pdf - model_pdf) ** 2).sum(axis=-1)
+        cdf_sq_err = ((empiric_cdf - F[..., 1:]) ** 2).sum(axis=-1)
+        # as in `fit` the means refer to the number of edges
+        pdf_var = ((empiric_pdf - 1 / n_edges) ** 2).sum(axis=-1)
+        cdf_var = ((empiric_cdf - empiric_cdf[..., -1:] / n_edges) ** 2).sum(axis=-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            kl = np.where(empiric_pdf > 0, empiric_pdf * np.log(empiric_pdf / (model_pdf + 0.0001) + 0.0001), 0.0).sum(axis=-1)
+            return {
+                "mse": sq_err / (n_edges - 1),
+                "cdf_mse": cdf_sq_err / (n_edges - 1),
+                "r2": 1 - sq_err / pdf_var,
+                "cdf_r2": 1 - cdf_sq_err / cdf_var,
+                "kl": kl,
+                "rel": np.where(empiric_pdf > 0, np.abs(empiric_pdf - model_pdf), 0.0).sum(axis=-1),
+            }
 
     def rel_fit(self, X: np.array, k: int) -> float:
         '''
@@ -195,17 +443,11 @@ class Weibull:
         i.e. for all the empiric data of X is sorted in k bins and the 
         expected relative error for a bin is calculated
         '''
-        err=0.0
         max_wind=int(np.nanmax(X)+1)
-        
         edges=np.linspace(0,max_wind, k+1)
         empiric_pdf= np.histogram(X, bins=edges)[0]
         empiric_pdf=empiric_pdf/(empiric_pdf.sum())
-        for i in range(0, len(edges)-1):
-            if empiric_pdf[i] >0:
-                err=err + empiric_pdf[i]*abs(empiric_pdf[i] - (self.cdf(edges[i+1]) -self.cdf(edges[i])))/empiric_pdf[i] 
-                
-        return err
+        return Weibull.gof(self.lambd, self.beta, empiric_pdf, edges)["rel"].item()
 
     def fit(self, X: np.array):
         '''
@@ -214,66 +456,65 @@ class Weibull:
         '''
         # find an appropriate number of bins to sort in, as suggested in the lecture
         X=X.dropna().to_numpy()
-        n_bins=int(0.1*np.sqrt(len(X)))+ 2 #int(0.1* np.sqrt(len(X)))+2
-        #print(f'number of bins for fitting is {n_bins}')
-        max_included_windspeed=int(np.nanmax(X)+1)
-        number_of_bins=n_bins
-        edges=np.linspace(0,max_included_windspeed, number_of_bins)
-        empiric_pdf= np.histogram(X, bins=edges)[0]
-        empiric_pdf=empiric_pdf/(empiric_pdf.sum())
+        empiric_pdf, edges = Weibull.fit_histogram(X)
+        metrics = Weibull.gof(self.lambd, self.beta, empiric_pdf, edges)
+        return [metrics[m].item() for m in ["mse", "cdf_mse", "r2", "cdf_r2", "kl"]]
+
 
-        # first do mse
-        mse=0
-        for i in range(0, len(edges)-1):
-            mse=mse + (empiric_pdf[i] - (self.cdf(edges[i+1]) -self.cdf(edges[i])))**2
-        mse=1/len(empiric_pdf)*mse
 
-        # do mse for the cdf
-        
-        cdf_mse=0
-        F_i=0
-        for i in range(0, len(edges)-1):
-            F_i=F_i+empiric_pdf[i]
-            cdf_mse=cdf_mse + (F_i - self.cdf(edges[i+1]))**2
-        cdf_mse=1/len(empiric_pdf)*cdf_mse
-
-        # then do r^2
-        enum=0
-        for i in range(0, number_of_bins-1):
-            enum=enum+(empiric_pdf[i] - (self.cdf(edges[i+1]) -self.cdf(edges[i])))**2
-
-        denom=0
-        for i in range(0, number_of_bins-1):
-            denom=denom+(empiric_pdf[i] - 1/number_of_bins)**2   
-
-        r2=1-enum/denom
-
-        # then do r^2 for the cdf
-        cdf_enum=0
-        F_i=0
-        for i in range(0, number_of_bins-1):
-            F_i=F_i+empiric_pdf[i]
-            cdf_enum=cdf_enum+(F_i- self.cdf(edges[i+1]))**2
-
-        mean_F_i= 1/number_of_bins*F_i
-        F_i=0
-        cdf_denom=0
-        for i in range(0, number_of_bins-1):
-            F_i=F_i+empiric_pdf[i]
-            cdf_denom=cdf_denom+(F_i - mean_F_i)**2   
-
-        cdf_r2=1-cdf_enum/cdf_denom
-        
-        # do the kl-divergence
-        kl=0
-        for i in range(0, len(edges)-1):
-            kl=kl+empiric_pdf[i]*np.log(empiric_pdf[i]/ (self.cdf(edges[i+1]) -self.cdf(edges[i])+0.0001) +0.0001)
 
 
-        return [mse.item(),cdf_mse.item(), r2.item(), cdf_r2.item(), kl]
 
+class WeibullAccumulator:
+    """
+    Sufficient statistics for the ML estimation of the Weibull parameters of
+    quantized data (DWD wind speeds come in steps of 0.1 m/s). The sample is
+    kept as a histogram of counts per multiple of `resolution`, so it can be
+    fed chunk by chunk with `update` and combined across workers with `merge`
+    without ever holding the raw observations.
+    """
 
+    def __init__(self, resolution: float = 0.1):
+        self.resolution = resolution
+        self.counts = np.zeros(0, dtype=np.int64)
 
+    def __repr__(self):
+        return "WeibullAccumulator(n=%s, distinct=%s)" % (self.n, np.count_nonzero(self.counts))
 
+    @property
+    def n(self) -> int:
+        return int(self.counts.sum())
 
+    def _add_counts(self, counts: np.ndarray):
+        if len(counts) > len(self.counts):
+            self.counts = np.concatenate([self.counts, np.zeros(len(counts) - len(self.counts), dtype=np.int64)])
+        self.counts[:len(counts)] += counts
+
+    def update(self, X: np.ndarray):
+        """
+        Adds the positive values of X (NaN and non-positive values are ignored like in `Weibull.estimate`).
+        """
+        X = np.asarray(X, dtype=float)
+        X = X[X > 0]
+        self._add_counts(np.bincount(np.rint(X / self.resolution).astype(np.int64)))
+        return self
+
+    def merge(self, other):
+        """
+        Adds the counts of another accumulator (e.g. from a different worker or chunk).
+        """
+        if other.resolution != self.resolution:
+            raise ValueError("cannot merge accumulators with different resolutions")
+        self._add_counts(other.counts)
+        return self
+
+    def histogram(self) -> tuple:
+        """
+        Returns the distinct values and their counts.
+        """
+        codes = np.flatnonzero(self.counts)
+        return codes * self.resolution, self.counts[codes]
 
+    def estimate(self) -> Weibull:
+        values, counts = self.histogram()
+        return Weibull.ml_counts(values, counts)